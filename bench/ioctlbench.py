@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Microbenchmark of the single usb2lpt port accesses.
+
+Counts calls per second of inStatus and outData, once through the old
+path (prototype looked up and ctypes buffers allocated on every call) and
+once through the bound fast path of usb2lpt.  Needs Windows and an adapter:
+
+    python bench/ioctlbench.py [DEVICE] [SECONDS]
+"""
+import ctypes
+import ctypes.wintypes as wintypes
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pyioctl
+import usb2lpt
+
+def _legacyIoctl(port, inbuf, inbufsiz, outbuf, outbufsiz):
+    # the per call work usb2lpt did before the fast path
+    DeviceIoControl_Fn = pyioctl.windll.kernel32.DeviceIoControl
+    DeviceIoControl_Fn.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.LPVOID, wintypes.DWORD,
+                                   wintypes.LPVOID, wintypes.DWORD, pyioctl.LPDWORD, pyioctl.LPOVERLAPPED]
+    DeviceIoControl_Fn.restype = wintypes.BOOL
+    dwBytesReturned = wintypes.DWORD(0)
+    return DeviceIoControl_Fn(port.dctl._fhandle, port.ioctls['IOCTL_VLPT_OutIn'],
+                              inbuf, inbufsiz, outbuf, outbufsiz, ctypes.byref(dwBytesReturned), None)
+
+def legacyInStatus(port):
+    b = ctypes.c_ubyte(0x11)
+    rv = ctypes.c_ubyte(0)
+    _legacyIoctl(port, ctypes.pointer(b), 1, ctypes.pointer(rv), 1)
+    return rv.value
+
+def legacyOutData(port):
+    oarr = (2 * ctypes.c_ubyte)(0, 2)
+    _legacyIoctl(port, ctypes.pointer(oarr), 2, None, 0)
+
+def rate(fn, seconds):
+    calls = 0
+    start = time.perf_counter()
+    end = start + seconds
+    while time.perf_counter() < end:
+        for i in range(100):
+            fn()
+        calls += 100
+    return calls / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    dev = sys.argv[1] if len(sys.argv) > 1 else 'autodetect'
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+    port = usb2lpt.usb2lpt(dev)
+    port.outData(2)
+    cases = [
+        ('inStatus', lambda: legacyInStatus(port), port.inStatus),
+        ('outData', lambda: legacyOutData(port), lambda: port.outData(2)),
+        ]
+    print(f"{'access':10s} {'before':>14s} {'after':>14s} {'speedup':>8s}")
+    for name, before, after in cases:
+        rb = rate(before, seconds)
+        ra = rate(after, seconds)
+        print(f"{name:10s} {rb:10.0f} c/s {ra:10.0f} c/s {ra/rb:7.2f}x")
@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Reproducible throughput benchmark of pytrans transfers.
+
+Every case runs transmitFile, receiveFile or listFiles end-to-end against
+a fresh simulated Portfolio (simpofo) with seeded payloads, so two runs of
+the same tree do the same port accesses.  Reported per case: bytes/sec,
+ioctls per byte, Python CPU time per byte and peak traced memory.
+
+    python bench/transferbench.py [--batch] [--shadow] [--latency N] [--sizes 16,1024,...]
+                                  [--full] [--files N] [--no-memory]
+                                  [--json OUT] [--baseline OLD]
+
+--full adds the 32 MiB transmitFile limit, which takes a long while.
+Peak memory is taken in a second, traced run of every case, --no-memory
+skips it.
+--json stores the results, --baseline compares them with an earlier file.
+"""
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import linkstats
+import nibble
+import pofoproto
+import pofosession
+import pytrans
+import simpofo
+
+SIZES = [16, 1024, 64*1024, 1024*1024]
+SMALL_FILES = 50
+SMALL_SIZE = 256
+
+memory = True
+
+shadow = False
+
+def payload(size, seed):
+    return random.Random(seed).randbytes(size)
+
+def connect(files, latency):
+    port = simpofo.simpofo(files, latency=latency)
+    stats = linkstats.linkstats()
+    pytrans.session = pofosession.PortfolioSession(port, pytrans.batch, pytrans.polls, stats=stats, shadow=shadow)
+    with contextlib.redirect_stdout(io.StringIO()):
+        pytrans.session.synchronize()
+    return port, stats
+
+def measure(name, nbytes, files, latency, run):
+    port, stats = connect(files, latency)
+    ioctls = stats.ioctls
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run(port)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    ioctls = stats.ioctls - ioctls
+    peak = 0
+    if memory:
+        # tracing slows the bit-bang loops down, so it gets a run of its own
+        port, stats = connect(files, latency)
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(port)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    result = {
+        'bytes': nbytes,
+        'seconds': wall,
+        'bytesPerSecond': nbytes / wall if wall else 0.0,
+        'ioctls': ioctls,
+        'ioctlsPerByte': ioctls / nbytes if nbytes else 0.0,
+        'cpuPerByte': cpu / nbytes if nbytes else 0.0,
+        'peakMemory': peak,
+        }
+    print(f"{name:24s} {nbytes:10d} B {result['bytesPerSecond']:10.1f} B/s "
+          f"{result['ioctlsPerByte']:7.1f} ioctl/B {result['cpuPerByte']*1e6:8.2f} us/B "
+          f"{peak/1024:9.1f} KiB")
+    return name, result
+
+def transmitCase(size, workdir, latency):
+    src = os.path.join(workdir, f"tx{size}.bin")
+    data = payload(size, size)
+    with open(src, 'wb') as fd:
+        fd.write(data)
+    def run(port):
+        pytrans.transmitFile(src, 'C:\\BENCH.BIN')
+        assert port.files['C:\\BENCH.BIN'] == data
+    return measure(f"transmit-{size}", size, {}, latency, run)
+
+def receiveCase(size, workdir, latency):
+    dest = os.path.join(workdir, f"rx{size}.bin")
+    data = payload(size, size)
+    def run(port):
+        pytrans.force = True
+        pytrans.receiveFile('C:\\BENCH.BIN', dest)
+        with open(dest, 'rb') as fd:
+            assert fd.read() == data
+    return measure(f"receive-{size}", size, {'C:\\BENCH.BIN':data}, latency, run)
+
+def transmitBatchCase(count, size, workdir, latency):
+    srcs = []
+    for i in range(count):
+        srcs.append(os.path.join(workdir, f"small{i:03d}.bin"))
+        with open(srcs[-1], 'wb') as fd:
+            fd.write(payload(size, i))
+    def run(port):
+        for i, src in enumerate(srcs):
+            pytrans.transmitFile(src, f"C:\\SMALL{i:03d}.BIN")
+        assert len(port.files) == count
+    return measure(f"transmit-{count}x{size}", count*size, {}, latency, run)
+
+def receiveBatchCase(count, size, workdir, latency):
+    dest = os.path.join(workdir, 'rxbatch')
+    os.mkdir(dest)
+    files = {f"C:\\SMALL{i:03d}.BIN":payload(size, i) for i in range(count)}
+    def run(port):
+        pytrans.force = True
+        pytrans.receiveFile('C:\\SMALL*.BIN', dest)
+        assert len(os.listdir(dest)) == count
+    return measure(f"receive-{count}x{size}", count*size, files, latency, run)
+
+def listCase(count, latency):
+    files = {f"C:\\SMALL{i:03d}.BIN":b'' for i in range(count)}
+    def run(port):
+        pytrans.listFiles('C:\\*.*')
+    return measure(f"list-{count}", count*len('SMALL000.BIN\0'), files, latency, run)
+
+def compare(results, baseline):
+    print(f"\n{'case':24s} {'B/s':>12s} {'baseline':>12s} {'change':>8s}")
+    for name, result in results['cases'].items():
+        old = baseline['cases'].get(name)
+        if not old or not old['bytesPerSecond']:
+            continue
+        change = result['bytesPerSecond'] / old['bytesPerSecond'] - 1
+        print(f"{name:24s} {result['bytesPerSecond']:12.1f} {old['bytesPerSecond']:12.1f} {change*100:+7.1f}%")
+
+if __name__ == '__main__':
+    sizes = list(SIZES)
+    latency = 0
+    count = SMALL_FILES
+    out = baseline = None
+    args = sys.argv[1:]
+    while args:
+        arg = args.pop(0)
+        if arg == '--batch':
+            pytrans.batch = pytrans.BATCH_BYTES
+        elif arg == '--shadow':
+            shadow = True
+        elif arg == '--latency':
+            latency = int(args.pop(0))
+        elif arg == '--sizes':
+            sizes = [int(x) for x in args.pop(0).split(',')]
+        elif arg == '--full':
+            sizes.append(pofoproto.MAX_TRANSMIT)
+        elif arg == '--files':
+            count = int(args.pop(0))
+        elif arg == '--no-memory':
+            memory = False
+        elif arg == '--json':
+            out = args.pop(0)
+        elif arg == '--baseline':
+            baseline = args.pop(0)
+        else:
+            print(__doc__)
+            exit(1)
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': nibble.numpy is not None,
+            'batch': pytrans.batch,
+            'polls': pytrans.polls,
+            'shadow': shadow,
+            'latency': latency,
+            },
+        'cases': {},
+        }
+    print(f"{'case':24s} {'size':>12s} {'throughput':>14s} {'ioctls':>13s} {'python':>11s} {'peak mem':>13s}")
+    with tempfile.TemporaryDirectory() as workdir:
+        cases = []
+        for size in sizes:
+            cases.append(lambda size=size: transmitCase(size, workdir, latency))
+            cases.append(lambda size=size: receiveCase(size, workdir, latency))
+        cases.append(lambda: transmitBatchCase(count, SMALL_SIZE, workdir, latency))
+        cases.append(lambda: receiveBatchCase(count, SMALL_SIZE, workdir, latency))
+        cases.append(lambda: listCase(count, latency))
+        for case in cases:
+            name, result = case()
+            results['cases'][name] = result
+
+    if out:
+        with open(out, 'w') as fd:
+            json.dump(results, fd, indent=2)
+    if baseline:
+        with open(baseline) as fd:
+            compare(results, json.load(fd))
@@ -0,0 +1,328 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Local file handling of pytrans transfers.
+
+receiveSink takes the payload blocks of a file received from the Portfolio.
+It writes into PATH.part, preallocated to the size the Portfolio announced,
+and renames it to PATH once the last byte arrived, so an aborted transfer
+never leaves a truncated file under the real name.  With mapped=True the
+blocks are copied straight into a memory map of the file instead of going
+through write().
+
+transmitSource is the other direction: it maps the file to send and hands
+out memoryview slices of the map, so a block goes from the page cache to
+sendBlock without an intermediate bytes object, whatever the file size.
+
+For batches of files the port thread should never wait on the disk:
+prefetcher opens the upcoming sources in a thread of its own and reads the
+small ones into buffers of a bounded pool, writeBehind runs the writes of
+receive sinks in a thread and hands their blocks over in pool buffers.
+"""
+import mmap
+import os
+import queue
+import threading
+
+PART_SUFFIX = '.part'
+
+PREFETCH_DEPTH = 2          # sources opened ahead of the one being sent
+PREFETCH_BUFSIZE = 0x100000 # larger files stay mapped and are only advised
+WRITE_BUFFERS = 8           # blocks the link may get ahead of the disk
+WRITE_BUFSIZE = 0x10000     # holds any payload block
+
+class fileioException(Exception):
+    pass
+
+class bufferPool:
+    """count bytearrays of size bytes, get blocks while all are in use"""
+
+    def __init__(self, count, size):
+        self.size = size
+        self.free = queue.Queue()
+        for i in range(count):
+            self.free.put(bytearray(size))
+
+    def get(self):
+        return self.free.get()
+
+    def put(self, buf):
+        self.free.put(buf)
+
+class writeBehind:
+    """
+    runs the file operations of receive sinks in order in a thread,
+    the first error is raised by the next submit or by flush
+    """
+
+    def __init__(self, count=WRITE_BUFFERS, size=WRITE_BUFSIZE):
+        self.pool = bufferPool(count, size)
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            fn, fallback, args, buf = self.queue.get()
+            try:
+                if fn is None:
+                    return
+                if self.error is None:
+                    fn(*args)
+                elif fallback:
+                    # after an error only the cleanup runs
+                    fallback()
+            except Exception as e:
+                self.error = e
+            finally:
+                if buf is not None:
+                    self.pool.put(buf)
+                self.queue.task_done()
+
+    def _raise(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def submit(self, fn, *args, fallback=None):
+        self._raise()
+        self.queue.put((fn, fallback, args, None))
+
+    def submitData(self, fn, data):
+        """copy data into a pool buffer and call fn(buf, len(data)) in the thread"""
+        self._raise()
+        length = len(data)
+        if length > self.pool.size:
+            raise fileioException(f"Block of {length} bytes exceeds the write buffers")
+        buf = self.pool.get()
+        buf[:length] = data
+        self.queue.put((fn, None, (buf, length), buf))
+
+    def flush(self):
+        """wait until everything submitted is on disk"""
+        self.queue.join()
+        self._raise()
+
+    def close(self):
+        self.queue.put((None, None, (), None))
+        self.thread.join()
+        self._raise()
+
+class receiveSink:
+
+    def __init__(self, path, mapped=False, writer=None):
+        self.path = path
+        self.tmp = path + PART_SUFFIX
+        self.mapped = mapped
+        self.writer = writer
+        self.fd = open(self.tmp, 'w+b')
+        self.map = None
+        self.size = None
+        self.pos = 0
+        self.closed = False
+
+    def allocate(self, size):
+        """reserve size bytes on disk for the announced file length"""
+        self.size = size
+        if self.writer:
+            self.writer.submit(self._allocate, size)
+        else:
+            self._allocate(size)
+
+    def _allocate(self, size):
+        if not size:
+            return
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(self.fd.fileno(), 0, size)
+        else:
+            self.fd.truncate(size)
+        if self.mapped:
+            self.map = mmap.mmap(self.fd.fileno(), size)
+
+    def write(self, data):
+        """append a block, data may be any buffer, e.g. a memoryview of the payload"""
+        length = len(data)
+        if self.size is not None and self.pos + length > self.size:
+            raise fileioException(f"{self.path}: more data than the announced {self.size} bytes")
+        pos = self.pos
+        self.pos += length
+        if self.writer:
+            # data is only valid until the next block arrives, the writer copies it
+            self.writer.submitData(lambda buf, length: self._write(pos, memoryview(buf)[:length]), data)
+        else:
+            self._write(pos, data)
+
+    def _write(self, pos, data):
+        if self.map is not None:
+            self.map[pos:pos+len(data)] = data
+        else:
+            self.fd.write(data)
+
+    def close(self):
+        """finish the file and move it to its real name"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.writer:
+            self.writer.submit(self._close, self.pos, fallback=self._abort)
+        else:
+            self._close(self.pos)
+
+    def _close(self, length):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.size is not None and length != self.size:
+            # shorter than announced, drop the preallocated tail
+            self.fd.truncate(length)
+        self.fd.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        """throw away an unfinished file, nothing happens after close"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.writer:
+            self.writer.submit(self._abort, fallback=self._abort)
+        else:
+            self._abort()
+
+    def _abort(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.fd.close()
+        os.remove(self.tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tb):
+        if typ is None:
+            self.close()
+        else:
+            self.abort()
+
+class transmitSource:
+
+    def __init__(self, path, pool=None):
+        self.path = path
+        self.fd = open(path, 'rb')
+        self.size = os.fstat(self.fd.fileno()).st_size
+        self.pos = 0
+        self.map = None
+        self.pool = pool
+        self.buffer = None
+        if not self.size:
+            # an empty file cannot be mapped
+            self.view = memoryview(b'')
+        elif pool and self.size <= pool.size:
+            # small enough to be read ahead into a pool buffer
+            self.buffer = pool.get()
+            self.view = memoryview(self.buffer)[:self.size]
+            try:
+                got = 0
+                while got < self.size:
+                    n = self.fd.readinto(self.view[got:])
+                    if not n:
+                        raise fileioException(f"{path}: file shrank while reading")
+                    got += n
+            except:
+                self.close()
+                raise
+        else:
+            self.map = mmap.mmap(self.fd.fileno(), 0, access=mmap.ACCESS_READ)
+            if pool and hasattr(self.map, 'madvise') and hasattr(mmap, 'MADV_WILLNEED'):
+                self.map.madvise(mmap.MADV_WILLNEED)
+            self.view = memoryview(self.map)
+
+    def rewind(self):
+        """start over, e.g. to send the file again"""
+        self.pos = 0
+
+    def read(self, size):
+        """the next size bytes as a memoryview of the map, shorter at the end"""
+        view = self.view[self.pos:self.pos+size]
+        self.pos += len(view)
+        return view
+
+    def close(self):
+        if self.fd is None:
+            return
+        self.view.release()
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                # a block is still referenced, e.g. by a traceback,
+                # the map goes away together with it
+                pass
+            self.map = None
+        if self.buffer is not None:
+            self.pool.put(self.buffer)
+            self.buffer = None
+        self.fd.close()
+        self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tb):
+        self.close()
+
+class prefetcher:
+    """
+    opens the sources of paths in order in a thread, at most depth of them
+    wait for the port thread, next(path) returns them as transmitSource
+    """
+
+    def __init__(self, paths, depth=PREFETCH_DEPTH, bufsize=PREFETCH_BUFSIZE):
+        # one buffer for the file being sent, depth for the ones waiting
+        self.pool = bufferPool(depth + 1, bufsize)
+        self.queue = queue.Queue(depth)
+        self.thread = threading.Thread(target=self._run, args=(list(paths),), daemon=True)
+        self.thread.start()
+
+    def _run(self, paths):
+        for path in paths:
+            try:
+                source = transmitSource(path, self.pool)
+            except (OSError, ValueError, fileioException) as e:
+                source = e
+            self.queue.put((path, source))
+
+    def next(self, path):
+        """the next source, raises the error that occurred opening it"""
+        expected, source = self.queue.get()
+        if expected != path:
+            raise fileioException(f"Prefetched {expected} but {path} was requested")
+        if isinstance(source, Exception):
+            raise source
+        return source
@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Performance counters of the Portfolio link.
+
+A linkstats object collects the port accesses (ioctls) of a backend, their
+latency as a log2 histogram, the status polls spent waiting for the
+Portfolio's clock, the wall time of every block and the retries the
+session needed to get over link errors.  Nothing is counted
+unless a backend was handed the object with lptport.enableStats, so a
+disabled link runs the plain port methods.
+"""
+import time
+
+class linkstats:
+
+    def __init__(self):
+        self.ioctls = 0
+        self.polls = 0
+        self.dropped = 0            # writes suppressed by lptport.enableShadow
+        self.latency = [0] * 40     # bucket k: [2**(k-1), 2**k) microseconds
+        self.blocks = []            # (kind, bytes, seconds, ioctls)
+        self.retries = {}           # error name: operations repeated after it
+
+    def timed(self, fn, polls=0):
+        # wrap a single port access, polls is the number of status polls it makes
+        perf_counter_ns = time.perf_counter_ns
+        latency = self.latency
+        def call(*args):
+            start = perf_counter_ns()
+            result = fn(*args)
+            latency[min(((perf_counter_ns() - start) // 1000).bit_length(), 39)] += 1
+            self.ioctls += 1
+            self.polls += polls
+            return result
+        return call
+
+    def timedProgram(self, fn):
+        # wrap runProgram, every segment of a program is one ioctl
+        perf_counter_ns = time.perf_counter_ns
+        latency = self.latency
+        def call(prog):
+            start = perf_counter_ns()
+            result = fn(prog)
+            segments = len(prog.segments)
+            latency[min(((perf_counter_ns() - start) // (1000 * segments)).bit_length(), 39)] += segments
+            self.ioctls += segments
+            self.polls += prog.nReads
+            return result
+        return call
+
+    def addBlock(self, kind, nbytes, seconds, ioctls):
+        self.blocks.append((kind, nbytes, seconds, ioctls))
+
+    def addRetry(self, error):
+        name = type(error).__name__
+        self.retries[name] = self.retries.get(name, 0) + 1
+
+    def totals(self, kind):
+        blocks = [b for b in self.blocks if b[0] == kind]
+        nbytes = sum(b[1] for b in blocks)
+        seconds = sum(b[2] for b in blocks)
+        ioctls = sum(b[3] for b in blocks)
+        return {
+            'blocks': len(blocks),
+            'bytes': nbytes,
+            'seconds': seconds,
+            'bytesPerSecond': nbytes / seconds if seconds else 0.0,
+            'slowestBytesPerSecond': min((b[1] / b[2] for b in blocks if b[2]), default=0.0),
+            'ioctlsPerByte': ioctls / nbytes if nbytes else 0.0,
+            }
+
+    def asdict(self):
+        return {
+            'ioctls': self.ioctls,
+            'polls': self.polls,
+            'droppedWrites': self.dropped,
+            'retries': dict(self.retries),
+            'latencyHistogram': {f"<{2**k}us":n for k, n in enumerate(self.latency) if n},
+            'send': self.totals('send'),
+            'receive': self.totals('receive'),
+            }
+
+    def summary(self):
+        lines = [f"Port accesses: {self.ioctls}, clock polls: {self.polls}, dropped writes: {self.dropped}"]
+        if self.retries:
+            lines.append(f"Retries: {sum(self.retries.values())} ("
+                         + ", ".join(f"{name}: {n}" for name, n in sorted(self.retries.items())) + ")")
+        for kind in ('send', 'receive'):
+            t = self.totals(kind)
+            if t['blocks']:
+                lines.append(f"{kind:8s}{t['blocks']:6d} blocks {t['bytes']:10d} bytes {t['seconds']:9.3f}s "
+                             f"{t['bytesPerSecond']:10.1f} B/s (slowest block {t['slowestBytesPerSecond']:.1f} B/s) "
+                             f"{t['ioctlsPerByte']:.1f} ioctls/byte")
+        total = sum(self.latency)
+        if total:
+            lines.append("Ioctl latency:")
+            for k, n in enumerate(self.latency):
+                if n:
+                    lines.append(f"  < {2**k:8d} us {n:10d} {'#' * max(1, 50 * n // total)}")
+        return "\n".join(lines)
@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Trace of the Portfolio link.
+
+A linkTrace keeps the last size records in a ring buffer allocated up
+front, a record is an event code, a perf_counter_ns timestamp and a value:
+the port value written or read, the bit, byte or block length.  Nothing is
+traced unless a link was handed the trace with enableTrace, which rebinds
+the traced methods of that one instance, so an untraced link runs the
+plain methods without checking for a trace at all.  dump() writes the
+records oldest first, PortfolioSession dumps the trace when an operation
+fails.
+"""
+import array
+import sys
+import time
+
+TRACE_RECORDS = 0x4000  # a power of two, about 300 bytes of link history
+
+# event codes, values in parentheses
+OUT_DATA = 1        # (data port value written)
+OUT_CONTROL = 2     # (control port value written)
+IN_STATUS = 3       # (status port value read)
+POLL_STATUS = 4     # (status matching the poll, -1 if none did)
+PROGRAM = 5         # (opcode bytes of a program run)
+WAIT_HIGH = 10      # (status seen)
+WAIT_LOW = 11       # (status seen)
+GET_BIT = 12        # (bit)
+RECEIVE_BYTE = 13   # (byte)
+SEND_BYTE = 14      # (byte)
+SEND_BLOCK = 20     # (length)
+RECEIVE_BLOCK = 21  # (length)
+SYNC = 22           # (0x50)
+ERROR = 23          # (none)
+PROBE_FOUND = 30    # (LPT number of the device probed, 0 for any other device)
+PROBE_FAILED = 31   # (LPT number)
+
+NAMES = {
+    OUT_DATA: 'outData',
+    OUT_CONTROL: 'outControl',
+    IN_STATUS: 'inStatus',
+    POLL_STATUS: 'pollStatus',
+    PROGRAM: 'runProgram',
+    WAIT_HIGH: 'waitClockHigh',
+    WAIT_LOW: 'waitClockLow',
+    GET_BIT: 'getBit',
+    RECEIVE_BYTE: 'receiveByte',
+    SEND_BYTE: 'sendByte',
+    SEND_BLOCK: 'sendBlock',
+    RECEIVE_BLOCK: 'receiveBlock',
+    SYNC: 'synchronize',
+    ERROR: 'error',
+    PROBE_FOUND: 'probeFound',
+    PROBE_FAILED: 'probeFailed',
+    }
+
+class linkTrace:
+
+    def __init__(self, size=TRACE_RECORDS):
+        if size & (size - 1):
+            raise ValueError(f"Trace size {size} is not a power of two")
+        self.mask = size - 1
+        self.codes = array.array('B', bytes(size))
+        self.times = array.array('q', [0]) * size
+        self.values = array.array('q', [0]) * size
+        self.count = 0          # records written, the ring holds the last size
+
+    def record(self, code, value=0):
+        i = self.count & self.mask
+        self.codes[i] = code
+        self.times[i] = time.perf_counter_ns()
+        self.values[i] = value
+        self.count += 1
+
+    def traceArgument(self, fn, code, index=0):
+        """fn recording code with its argument index as value"""
+        record = self.record
+        def call(*args):
+            record(code, args[index])
+            return fn(*args)
+        return call
+
+    def traceResult(self, fn, code):
+        """fn recording code with its result as value, -1 for None"""
+        record = self.record
+        def call(*args):
+            result = fn(*args)
+            record(code, -1 if result is None else result)
+            return result
+        return call
+
+    def records(self):
+        """(code, ns, value) of the records in the ring, oldest first"""
+        first = max(0, self.count - self.mask - 1)
+        mask = self.mask
+        return [(self.codes[i & mask], self.times[i & mask], self.values[i & mask])
+                for i in range(first, self.count)]
+
+    def dump(self, title=None, file=None):
+        file = file or sys.stderr
+        records = self.records()
+        if title:
+            file.write(f"{title}\n")
+        file.write(f"Last {len(records)} of {self.count} link events:\n")
+        last = records[-1][1] if records else 0
+        for code, ns, value in records:
+            file.write(f"{(ns - last) / 1000:12.1f}us {NAMES.get(code, code):14s} {value:02x}\n"
+                       if value >= 0 else
+                       f"{(ns - last) / 1000:12.1f}us {NAMES.get(code, code):14s}\n")
+        file.flush()
+
+    def clear(self):
+        self.count = 0
@@ -0,0 +1,266 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Port backend interface used by pytrans.
+
+A backend provides the single port accesses of the usb2lpt class
+(outData, inStatus, inTriple, ...) and runProgram, which executes a whole
+lptProgram of writes and reads and returns every read result as a buffer.
+usb2lpt runs a program with one ioctl per segment, the generic version
+below simply replays it through the single accesses.
+
+waitStatus polls the status port until a condition holds.  It spins first,
+then yields the CPU and finally sleeps with a growing delay, so a stalled
+Portfolio or a pulled cable neither burns a core nor floods the USB bus,
+and it raises timeoutException once the timeout has passed.
+
+enableShadow keeps shadow copies of the data and control register and drops
+writes that would not change the pins.  The Portfolio only samples levels,
+so a write of the latched value is invisible to it and just costs an ioctl.
+
+enableTrace records the port accesses in a linktrace.linkTrace, like
+enableStats it rebinds the methods of the instance, an untraced backend
+pays nothing.
+"""
+import linktrace
+import time
+
+SPIN_TIME = 0.001   # seconds of back to back polls
+YIELD_TIME = 0.01   # then polls that give up the time slice in between
+SLEEP_MIN = 0.0001  # then sleeps, doubled after every poll
+SLEEP_MAX = 0.005
+
+
+class lptportException(Exception):
+    pass
+
+class lptportTimeout(lptportException):
+    pass
+
+class lptProgram:
+    """
+    Builder for IOCTL_VLPT_OutIn command programs.
+
+    The OutIn input buffer is a plain sequence of opcodes: a port address
+    (0 data, 1 status, 2 control) followed by the value to write, or a read
+    opcode (0x10 data, 0x11 status, 0x12 control).  The adapter runs them in
+    order and returns one byte per read opcode.  Programs longer than maxLen
+    are split into segments, each segment costs one ioctl: a code added in
+    one piece goes into the next segment where it does not fit, a code
+    added in units of one byte (see extend) is split between units.
+    """
+    def __init__(self, maxLen=4096):
+        self.maxLen = maxLen
+        self.segments = [[bytearray(), 0]]
+        self.nReads = 0
+
+    def _segment(self, size):
+        seg = self.segments[-1]
+        if seg[0] and len(seg[0]) + size > self.maxLen:
+            seg = [bytearray(), 0]
+            self.segments.append(seg)
+        return seg
+
+    def extend(self, code, nReads, unit=None):
+        """
+        code has to be a complete opcode sequence holding nReads read
+        opcodes; with unit it is a run of unit long opcode sequences
+        holding the same number of reads each, e.g. the code of one byte
+        sent, and may be split after any of them
+        """
+        if not unit:
+            unit = len(code)
+        reads = nReads * unit // len(code) if code else 0
+        view = memoryview(code)
+        pos = 0
+        while pos < len(code):
+            seg = self._segment(unit)
+            # as many units as fit, at least one
+            n = max(unit, (self.maxLen - len(seg[0])) // unit * unit)
+            seg[0] += view[pos:pos+n]
+            seg[1] += reads * (min(n, len(code)-pos) // unit)
+            pos += n
+        self.nReads += nReads
+
+    def outData(self, data):
+        self.extend(bytes((0, data)), 0)
+
+    def outControl(self, data):
+        self.extend(bytes((2, data)), 0)
+
+    def inData(self, count=1):
+        self.extend(b'\x10' * count, count)
+
+    def inStatus(self, count=1):
+        self.extend(b'\x11' * count, count)
+
+    def inControl(self, count=1):
+        self.extend(b'\x12' * count, count)
+
+    def __len__(self):
+        return sum(len(code) for code, nReads in self.segments)
+
+class lptport:
+    dev = None
+    stats = None
+    pollReads = 1   # status reads per pollStatus
+    timeoutException = lptportTimeout
+    trace = None
+    shadowData = None       # last value written, None while unknown
+    shadowControl = None
+    dropped = 0             # writes suppressed by the shadow registers
+
+    def enableStats(self, stats):
+        """count and time every port access of this backend in a linkstats object"""
+        self.stats = stats
+        for name in ('inData', 'inStatus', 'inControl', 'inTriple', 'outData', 'outControl'):
+            setattr(self, name, stats.timed(getattr(type(self), name).__get__(self)))
+        self.pollStatus = stats.timed(type(self).pollStatus.__get__(self), self.pollReads)
+        self.runProgram = stats.timedProgram(type(self).runProgram.__get__(self))
+
+    def enableTrace(self, trace):
+        """
+        record the port accesses of this backend in a linktrace.linkTrace,
+        call it before enableShadow so only writes reaching the port show up
+        """
+        self.trace = trace
+        self.outData = trace.traceArgument(self.outData, linktrace.OUT_DATA)
+        self.outControl = trace.traceArgument(self.outControl, linktrace.OUT_CONTROL)
+        self.inStatus = trace.traceResult(self.inStatus, linktrace.IN_STATUS)
+        self.pollStatus = trace.traceResult(self.pollStatus, linktrace.POLL_STATUS)
+        runProgram = self.runProgram
+        def tracedProgram(prog):
+            trace.record(linktrace.PROGRAM, len(prog))
+            return runProgram(prog)
+        self.runProgram = tracedProgram
+
+    def enableShadow(self):
+        """
+        drop data and control writes of the value already latched,
+        call it after enableStats so dropped writes are not counted as ioctls
+        """
+        outData, outControl, runProgram = self.outData, self.outControl, self.runProgram
+        def dropped():
+            self.dropped += 1
+            if self.stats:
+                self.stats.dropped += 1
+        def writeData(data):
+            if data == self.shadowData:
+                dropped()
+                return
+            outData(data)
+            self.shadowData = data
+        def writeControl(data):
+            if data == self.shadowControl:
+                dropped()
+                return
+            outControl(data)
+            self.shadowControl = data
+        def writeProgram(prog):
+            # the writes inside a program are not tracked
+            self.shadowData = self.shadowControl = None
+            return runProgram(prog)
+        self.outData = writeData
+        self.outControl = writeControl
+        self.runProgram = writeProgram
+
+    def inData(self):
+        raise NotImplementedError
+
+    def inStatus(self):
+        raise NotImplementedError
+
+    def inControl(self):
+        raise NotImplementedError
+
+    def inTriple(self):
+        return (self.inData(), self.inStatus(), self.inControl())
+
+    def outData(self, data):
+        raise NotImplementedError
+
+    def outControl(self, data):
+        raise NotImplementedError
+
+    def pollStatus(self, mask, value):
+        """
+        read the status port pollReads times in one access,
+        returns the first value with status & mask == value or None
+        """
+        # the class method, a poll counts as one access
+        status = type(self).inStatus(self)
+        return status if status & mask == value else None
+
+    def waitStatus(self, mask, value, timeout=None):
+        """
+        poll until status & mask == value and return that status value,
+        raises timeoutException after timeout seconds, None waits forever
+        """
+        status = self.pollStatus(mask, value)
+        if status is not None:
+            return status
+        start = time.perf_counter()
+        delay = SLEEP_MIN
+        while True:
+            status = self.pollStatus(mask, value)
+            if status is not None:
+                return status
+            elapsed = time.perf_counter() - start
+            if timeout is not None and elapsed > timeout:
+                raise self.timeoutException(f"Timeout after {elapsed:.1f}s waiting for status {value:02x} (mask {mask:02x}) on {self.dev}")
+            if elapsed < SPIN_TIME:
+                continue
+            elif elapsed < YIELD_TIME:
+                time.sleep(0)
+            else:
+                time.sleep(delay)
+                delay = min(delay * 2, SLEEP_MAX)
+
+    def runProgram(self, prog):
+        """
+        run a lptProgram through the single port accesses,
+        returns a bytearray with the result of every read opcode in order
+        """
+        # the class methods, a program counts as one access per segment
+        cls = type(self)
+        reads = {0x10:cls.inData, 0x11:cls.inStatus, 0x12:cls.inControl}
+        writes = {0:cls.outData, 2:cls.outControl}
+        result = bytearray()
+        for code, nReads in prog.segments:
+            i = 0
+            while i < len(code):
+                op = code[i]
+                if op in reads:
+                    result.append(reads[op](self))
+                    i += 1
+                elif op in writes:
+                    writes[op](self, code[i+1])
+                    i += 2
+                else:
+                    raise lptportException(f"Invalid opcode {op:02x} in program!")
+        return result
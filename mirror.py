@@ -0,0 +1,291 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Bookkeeping for incremental transfers.
+
+The Portfolio only tells a file's size in the control block that starts
+its transfer, and a started transfer has to run to the end, so a pull
+cannot ask the Portfolio whether a file changed.  mirrorState remembers
+instead, per mirror directory, what the last pull of every Portfolio file
+wrote: the announced size and the size and mtime of the local copy.  A file
+listed again whose local copy is still exactly that is skipped; new files,
+and files whose local copy was changed or removed, are fetched.
+
+pushManifest is the other direction: per Portfolio and Portfolio path it
+remembers size and SHA-256 of the content last transmitted, so a push of
+the same files can skip what is already there.  The sources are hashed by
+a pool of threads, started before the first transmit, so the hashing of a
+batch overlaps the time spent on the link.
+
+batchJournal makes a batch of -t or -r resumable.  It is an append-only
+file of JSON lines: the batch it belongs to, the listings the batch
+fetched and every file completed, with size and SHA-256 of what went over
+the link.  A resumed batch takes the listings from the journal and skips
+the files whose local copy still has that content.  Every batch has a
+journal of its own, named after a hash of the batch, so another run in
+between leaves the journal of an interrupted batch alone; journals of
+batches abandoned for JOURNAL_AGE are removed.
+"""
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import time
+
+STATE_NAME = '.pytrans-mirror.json'
+MANIFEST_PATH = os.path.join(os.path.expanduser('~'), '.pytrans-push.json')
+JOURNAL_PATH = os.path.join(os.path.expanduser('~'), '.pytrans-journal-{}.jsonl')
+JOURNAL_AGE = 30 * 24 * 3600    # seconds after which an abandoned journal is removed
+HASH_WORKERS = 4
+HASH_BUFSIZE = 0x100000
+
+class mirrorException(Exception):
+    pass
+
+class mirrorState:
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, STATE_NAME)
+        self.files = {}
+        self.saved = 0      # bytes not transferred in this run
+        self.skipped = 0
+        try:
+            with open(self.path) as fd:
+                self.files = json.load(fd)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            raise mirrorException(f"{self.path}: {e}")
+
+    def unchanged(self, key, path):
+        """
+        the size of key if path still holds what the last pull wrote,
+        None if it has to be fetched
+        """
+        entry = self.files.get(key)
+        if entry is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_size != entry['size'] or st.st_mtime_ns != entry['mtime']:
+            return None
+        return entry['size']
+
+    def skip(self, size):
+        self.skipped += 1
+        self.saved += size
+
+    def record(self, key, path, size):
+        """key was pulled to path, size is the length the Portfolio announced"""
+        st = os.stat(path)
+        self.files[key] = {'size': size, 'mtime': st.st_mtime_ns}
+
+    def save(self):
+        tmp = self.path + '.part'
+        with open(tmp, 'w') as fd:
+            json.dump(self.files, fd, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+def hashFile(path):
+    """size and SHA-256 hex digest of a local file"""
+    digest = hashlib.sha256()
+    buf = bytearray(HASH_BUFSIZE)
+    view = memoryview(buf)
+    size = 0
+    with open(path, 'rb') as fd:
+        while True:
+            n = fd.readinto(buf)
+            if not n:
+                break
+            digest.update(view[:n])
+            size += n
+    return size, digest.hexdigest()
+
+class pushManifest:
+
+    def __init__(self, device, path=MANIFEST_PATH):
+        self.path = path
+        self.manifest = {}
+        self.pool = None
+        self.futures = {}
+        self.saved = 0
+        self.skipped = 0
+        try:
+            with open(path) as fd:
+                self.manifest = json.load(fd)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            raise mirrorException(f"{path}: {e}")
+        self.files = self.manifest.setdefault(device, {})
+
+    def prepare(self, paths, workers=HASH_WORKERS):
+        """start hashing the sources of a batch in the background"""
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers)
+        for path in paths:
+            if path not in self.futures:
+                self.futures[path] = self.pool.submit(hashFile, path)
+
+    def digest(self, path):
+        """size and digest of path, raises OSError like open"""
+        future = self.futures.pop(path, None)
+        if future is None:
+            return hashFile(path)
+        return future.result()
+
+    def unchanged(self, pofoName, size, digest):
+        """True if exactly this content was the last one pushed to pofoName"""
+        entry = self.files.get(pofoName.upper())
+        return entry is not None and entry['size'] == size and entry['sha256'] == digest
+
+    def skip(self, size):
+        self.skipped += 1
+        self.saved += size
+
+    def record(self, pofoName, size, digest):
+        self.files[pofoName.upper()] = {'size': size, 'sha256': digest}
+        self.save()
+
+    def save(self):
+        tmp = self.path + '.part'
+        with open(tmp, 'w') as fd:
+            json.dump(self.manifest, fd, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+def pruneJournals(age=JOURNAL_AGE):
+    """remove the journals not written to for age seconds"""
+    limit = time.time() - age
+    for path in glob.glob(JOURNAL_PATH.format('*')):
+        try:
+            if os.stat(path).st_mtime < limit:
+                os.remove(path)
+        except OSError:
+            pass
+
+def journalPath(batch):
+    """the journal of batch, JOURNAL_PATH with a hash of batch filled in"""
+    key = hashlib.sha256(json.dumps(batch, sort_keys=True).encode('utf-8'))
+    return JOURNAL_PATH.format(key.hexdigest()[:16])
+
+class batchJournal:
+
+    def __init__(self, batch, resume=False, path=None):
+        """
+        batch is a dict naming the work, e.g. mode, device, sources and
+        dest; resume continues the journal of the same batch, otherwise a
+        new journal replaces the old one of this batch
+        """
+        self.path = path or journalPath(batch)
+        self.batch = batch
+        self.files = {}
+        self.listings = {}
+        self.saved = 0
+        self.skipped = 0
+        if resume and self._load():
+            self.fd = open(self.path, 'a')
+        else:
+            pruneJournals()
+            self.fd = open(self.path, 'w')
+            self._append({'batch': batch})
+
+    def _load(self):
+        try:
+            with open(self.path) as fd:
+                lines = fd.readlines()
+        except FileNotFoundError:
+            return False
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # the line being written when the batch died
+                break
+        if not records or records[0].get('batch') != self.batch:
+            raise mirrorException(f"{self.path} belongs to another batch, run it without --resume")
+        for record in records[1:]:
+            if 'done' in record:
+                self.files[record['done']] = record
+            elif 'listing' in record:
+                self.listings[record['listing']] = record['names']
+        return True
+
+    def _append(self, record):
+        self.fd.write(json.dumps(record) + '\n')
+        self.fd.flush()
+        # a record must survive whatever ends the batch
+        os.fsync(self.fd.fileno())
+
+    def listing(self, key):
+        """names of a listing fetched before, None if there is none"""
+        return self.listings.get(key)
+
+    def listed(self, key, names):
+        self.listings[key] = names
+        self._append({'listing': key, 'names': names})
+
+    def completed(self, key, path):
+        """size of key if it was completed and path still holds that content"""
+        entry = self.files.get(key)
+        if entry is None:
+            return None
+        try:
+            size, digest = hashFile(path)
+        except OSError:
+            return None
+        if size != entry['size'] or digest != entry['sha256']:
+            return None
+        return size
+
+    def skip(self, size):
+        self.skipped += 1
+        self.saved += size
+
+    def record(self, key, path, size, digest):
+        """key went over the link, path is the local file, digest the hex SHA-256"""
+        entry = {'done': key, 'path': path, 'size': size, 'sha256': digest}
+        self.files[key] = entry
+        self._append(entry)
+
+    def close(self):
+        if self.fd:
+            self.fd.close()
+            self.fd = None
+
+    def finish(self):
+        """the batch is complete, nothing is left to resume"""
+        self.close()
+        os.remove(self.path)
@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Precomputed waveforms of the Portfolio nibble protocol.
+
+Every byte is clocked out as four bit pairs, MSB first.  For each pair the
+host writes the first bit with and without the clock (data port bit 1),
+waits for the Portfolio to pull its clock (status bit 5) low, writes the
+second bit without and with the clock and waits for the clock to go high.
+That gives 16 data port writes and 8 expected clock states per byte, which
+are the same for every call, so they are built once for all 256 values.
+
+When NumPy is available whole blocks are encoded, decoded and checksummed
+vectorized, otherwise the same tables are used from pure Python.
+"""
+import lptport
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class nibbleException(Exception):
+    pass
+
+# expected Portfolio clock (status bit 5) after every handshake step of a byte
+CLOCK_PATTERN = bytes([0x00, 0x20] * 4)
+CLOCK_BITS = bytes(i & 0x20 for i in range(256))
+DATA_BITS = bytes((i & 0x10) >> 4 for i in range(256))
+
+def _waveform(byte):
+    outs = bytearray()
+    for i in range(4):
+        b = (byte & 0x80) >> 7
+        outs += bytes((b | 2, b))
+        byte = byte << 1
+        b = (byte & 0x80) >> 7
+        outs += bytes((b, b | 2))
+        byte = byte << 1
+    return bytes(outs)
+
+# data port outputs of sendByte, 16 per byte value
+SEND_TABLE = [_waveform(byte) for byte in range(256)]
+
+# bit samples of receiveByte (MSB first, one byte 0/1 per bit) -> byte value
+RECEIVE_TABLE = {bytes((byte >> (7-i)) & 1 for i in range(8)):byte for byte in range(256)}
+
+if numpy is not None:
+    SEND_ARRAY = numpy.frombuffer(b''.join(SEND_TABLE), dtype=numpy.uint8).reshape(256, 16)
+    CLOCK_ARRAY = numpy.frombuffer(CLOCK_PATTERN, dtype=numpy.uint8)
+
+_sendPrograms = {}
+
+def encode(data):
+    """flat data port output sequence for a whole block"""
+    if numpy is not None:
+        return SEND_ARRAY[numpy.frombuffer(data, dtype=numpy.uint8)].tobytes()
+    outs = bytearray(16 * len(data))
+    pos = 0
+    for byte in data:
+        outs[pos:pos+16] = SEND_TABLE[byte]
+        pos += 16
+    return outs
+
+def sendProgram(polls):
+    """
+    256 IOCTL_VLPT_OutIn opcode fragments, one per byte value, each writes
+    the waveform of the byte and polls the status port after every step
+    """
+    table = _sendPrograms.get(polls)
+    if table is None:
+        table = []
+        for outs in SEND_TABLE:
+            code = bytearray()
+            for i in range(0, 16, 2):
+                code += bytes((0, outs[i], 0, outs[i+1])) + b'\x11' * polls
+            table.append(bytes(code))
+        if numpy is not None:
+            table = numpy.frombuffer(b''.join(table), dtype=numpy.uint8).reshape(256, -1)
+        _sendPrograms[polls] = table
+    return table
+
+def encodeProgram(data, polls):
+    """opcodes sending all bytes of data, 8*polls status reads per byte"""
+    table = sendProgram(polls)
+    if numpy is not None:
+        return table[numpy.frombuffer(data, dtype=numpy.uint8)].tobytes()
+    return b''.join(map(table.__getitem__, data))
+
+def receiveProgram(polls):
+    """opcode fragment receiving one byte, polls before every acknowledge"""
+    prog = lptport.lptProgram()
+    for i in range(4):
+        prog.inStatus(polls)
+        prog.outData(0)
+        prog.inStatus(polls)
+        prog.outData(2)
+    return bytes(prog.segments[0][0])
+
+def clockEdges(samples, count, polls):
+    """
+    status samples of count bytes, polls per handshake step, reduced to the
+    first sample of every step showing the Portfolio's acknowledge
+    """
+    if numpy is not None:
+        steps = numpy.frombuffer(samples, dtype=numpy.uint8).reshape(-1, polls)
+        match = (steps & 0x20) == numpy.tile(CLOCK_ARRAY, count)[:, None]
+        first = match.argmax(axis=1)
+        if not match[numpy.arange(len(steps)), first].all():
+            raise nibbleException(f"No acknowledge in step {int(numpy.argmin(match.any(axis=1)))}")
+        return steps[numpy.arange(len(steps)), first].tobytes()
+    clocks = bytes(samples).translate(CLOCK_BITS)
+    edges = bytearray(8*count)
+    pos = 0
+    for i in range(8*count):
+        j = clocks.find(CLOCK_PATTERN[i & 7], pos, pos+polls)
+        if j < 0:
+            raise nibbleException(f"No acknowledge in step {i}")
+        edges[i] = samples[j]
+        pos += polls
+    return edges
+
+def decode(edges):
+    """bytes from the status samples taken at the clock edges, 8 per byte"""
+    if numpy is not None:
+        bits = (numpy.frombuffer(edges, dtype=numpy.uint8) >> 4) & 1
+        return bytearray(numpy.packbits(bits.reshape(-1, 8), axis=1).tobytes())
+    bits = bytes(edges).translate(DATA_BITS)
+    return bytearray(map(RECEIVE_TABLE.__getitem__, (bits[i:i+8] for i in range(0, len(bits), 8))))
+
+def checksum(data):
+    """plain sum of all bytes, the protocol uses its low byte"""
+    if numpy is not None:
+        return int(numpy.frombuffer(data, dtype=numpy.uint8).sum(dtype=numpy.uint64))
+    return sum(data)
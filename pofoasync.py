@@ -0,0 +1,235 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+asyncio access to a Portfolio.
+
+The bit banging of a transfer blocks for as long as the transfer takes, so
+AsyncPortfolioSession runs all work of its PortfolioSession in one thread
+of its own, and an event loop only awaits the results.  get and put return
+a transfer right away, iterating it yields a progressEvent per block,
+awaiting it returns the result of the operation.
+
+    async with AsyncPortfolioSession(usb2lpt.usb2lpt()) as pofo:
+        print(await pofo.list('C:\\*.*'))
+        transfer = pofo.get('C:\\*.TXT', 'backup')
+        async for event in transfer:
+            print(f"{event.name} {event.done}/{event.total} {event.rate:.0f} B/s")
+        names = await transfer
+
+Cancelling a task awaiting a transfer, or calling its cancel(), ends the
+transfer at the next control block (see PortfolioSession.cancel), the
+transfer then raises pofosession.pofosessionCancelled.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import threading
+import time
+import pofosession
+
+# file of files is 0 based, block of blocks counts the payload blocks of the
+# file done so far, rate is in bytes per second since the file started
+progressEvent = collections.namedtuple('progressEvent',
+    'op name file files block blocks done total rate')
+
+class progressTracker:
+    """turns the file events of an operation into progressEvents for post"""
+
+    def __init__(self, op, post):
+        self.op = op
+        self.post = post
+        self.name = None
+        self.file = 0
+        self.files = 1
+        self.total = 0
+        self.blocks = 0
+        self.done = 0
+        self.block = 0
+        self.pending = 0    # size of the transmit block on the link
+        self.start = time.perf_counter()
+
+    def startFile(self, name, i, num):
+        self.name, self.file, self.files = name, i, num
+
+    def event(self, event):
+        kind = event[0]
+        if kind == 'file':
+            self.startFile(*event[1:])
+        elif kind == 'size':
+            self.total, blocksize = event[1:]
+            self.blocks = (self.total+blocksize-1) // blocksize
+            self.done = self.block = self.pending = 0
+            self.start = time.perf_counter()
+        elif kind == 'data':
+            self.advance(len(event[1]))
+        elif kind == 'read':
+            # a block is read right before it is sent,
+            # so the next read means the last one got through
+            self.flush()
+            self.pending = event[1]
+
+    def flush(self):
+        if self.pending:
+            self.advance(self.pending)
+            self.pending = 0
+
+    def advance(self, length):
+        self.done += length
+        self.block += 1
+        elapsed = time.perf_counter() - self.start
+        self.post(progressEvent(self.op, self.name, self.file, self.files,
+                                self.block, self.blocks, self.done, self.total,
+                                self.done / elapsed if elapsed else 0.0))
+
+class asyncTransfer:
+    """
+    an operation queued for the port thread, async iteration yields its
+    progressEvents, awaiting it its result
+    """
+
+    def __init__(self, owner, op, fn, *args):
+        self.session = owner.session
+        self.loop = asyncio.get_running_loop()
+        self.events = asyncio.Queue()
+        self.tracker = progressTracker(op, self._post)
+        self.cancelRequested = False
+        self.running = False
+        self.lock = threading.Lock()
+        self.future = self.loop.run_in_executor(owner.executor, self._run, fn, args)
+
+    def _post(self, event):
+        # called in the port thread
+        self.loop.call_soon_threadsafe(self.events.put_nowait, event)
+
+    def _run(self, fn, args):
+        session = self.session
+        with self.lock:
+            self.running = True
+            session.cancelled = self.cancelRequested
+        session.observer = self.tracker.event
+        try:
+            return fn(self.tracker, *args)
+        finally:
+            session.observer = None
+            with self.lock:
+                self.running = False
+                session.cancelled = False
+            self._post(None)
+
+    def cancel(self):
+        """end the transfer at the next control block, may be called any time"""
+        with self.lock:
+            self.cancelRequested = True
+            if self.running:
+                self.session.cancel()
+
+    async def _events(self):
+        while True:
+            event = await self.events.get()
+            if event is None:
+                return
+            yield event
+
+    def __aiter__(self):
+        return self._events()
+
+    async def result(self):
+        try:
+            # shielded, the port thread cannot be interrupted, only asked to stop
+            return await asyncio.shield(self.future)
+        except asyncio.CancelledError:
+            self.cancel()
+            # nobody awaits the outcome any more
+            self.future.add_done_callback(lambda future: future.cancelled() or future.exception())
+            raise
+
+    def __await__(self):
+        return self.result().__await__()
+
+class AsyncPortfolioSession:
+
+    def __init__(self, port, batch=0, polls=8, timeout=10.0, stats=None, shadow=False, log=print,
+                 retries=pofosession.RETRIES, trace=None):
+        self.session = pofosession.PortfolioSession(port, batch, polls, timeout, stats, shadow, log, retries,
+                                                    trace)
+        # the only thread touching the port
+        self.executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='pofo')
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def synchronize(self):
+        await self._call(self.session.synchronize)
+
+    async def list(self, pattern):
+        """names of the files matching pattern"""
+        return await self._call(self._list, pattern)
+
+    def _list(self, pattern):
+        # a long lived session must not answer from an old listing
+        self.session.listings.clear()
+        return self.session.list(pattern)
+
+    def get(self, pattern, dest, force=False, mapped=False, mirrored=False):
+        """receive the files matching pattern to dest, as PortfolioSession.get"""
+        return asyncTransfer(self, 'get', self._get, pattern, dest, force, mapped, mirrored)
+
+    def _get(self, tracker, pattern, dest, force, mapped, mirrored):
+        self.session.listings.clear()
+        return self.session.get(pattern, dest, force, mapped, mirrored=mirrored)
+
+    def put(self, sources, dest, force=False):
+        """
+        transmit the local files sources to dest, a Portfolio directory
+        for several sources; the result is the list of Portfolio paths sent
+        """
+        return asyncTransfer(self, 'put', self._put, list(sources), dest, force)
+
+    def _put(self, tracker, sources, dest, force):
+        session = self.session
+        sent = []
+        for i, src in enumerate(sources):
+            pofoName = pofosession.composePofoName(src, dest, len(sources))
+            tracker.startFile(pofoName, i, len(sources))
+            session.progress.startFile(pofoName, i, len(sources))
+            if session.put(src, pofoName, force):
+                tracker.flush()
+                sent.append(pofoName)
+        return sent
+
+    async def close(self):
+        # queued behind the work still pending
+        await self._call(lambda: None)
+        self.executor.shutdown()
+
+    async def __aenter__(self):
+        await self.synchronize()
+        return self
+
+    async def __aexit__(self, typ, val, tb):
+        await self.close()
@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Sans-IO core of the Portfolio transfer protocol.
+
+Nothing in here touches a port or a file.  The framing helpers turn block
+data into the bytes that go over the link and check what came back, the
+operations (listFiles, receiveFiles, transmitFile) are generators that
+yield what they need from the link and the file system as plain tuples:
+
+  ('send', block)             send block with sendBlock, reply None
+  ('recv', maxLen)            receive a block of at most maxLen bytes, reply
+                              its data (only read until the next event)
+  ('file', name, i, num)      receiveFiles: file i of num is next, reply
+                              True to receive it, False to skip it
+  ('size', total, blocksize)  size of the file being transferred
+  ('data', chunk)             receiveFiles: next payload chunk of the file
+  ('done', name)              receiveFiles: file completely received
+  ('exists', name)            transmitFile: destination exists, reply True
+                              to overwrite it
+  ('read', size)              transmitFile: reply the next size bytes
+
+Protocol errors raise pofoprotoException.  Its subclass pofoprotoLinkError
+stands for a block garbled on the wire, a checksum or acknowledge that
+does not match or a Portfolio not ready when it should be; after one the
+link has to be synchronized again, then the operation may be repeated.
+A driver, like the link code in
+pytrans, runs an operation with op.send(reply) until StopIteration, whose
+value is the result of the operation.
+"""
+import nibble
+
+CONTROL_BUFSIZE = 100
+LIST_BUFSIZE = 2000
+PAYLOAD_BUFSIZE = 60000
+MAX_FILENAME_LEN = 79
+MAX_TRANSMIT = 32 * 2**20
+
+RECEIVE_FINISH = bytes([0x20, 0x00, 0x03])
+TRANSMIT_OVERWRITE = bytes([0x05, 0x00, 0x70])
+TRANSMIT_CANCEL = bytes([0x00, 0x00, 0x00])
+
+class pofoprotoException(Exception):
+    pass
+
+class pofoprotoLinkError(pofoprotoException):
+    pass
+
+class pofoprotoChecksumError(pofoprotoLinkError):
+    pass
+
+class pofoprotoAckError(pofoprotoLinkError):
+    pass
+
+class pofoprotoNotReady(pofoprotoLinkError):
+    pass
+
+def _name(name):
+    name = name.encode('latin-1', 'replace')
+    if len(name) > MAX_FILENAME_LEN:
+        raise pofoprotoException(f"Name too long! (maxlength : {MAX_FILENAME_LEN}, name:{len(name)})")
+    return name
+
+def listRequest(pattern):
+    block = bytearray(82)
+    block[0:3] = b'\x06\x00\x70'
+    name = _name(pattern)
+    block[3:3+len(name)] = name
+    return block
+
+def receiveRequest(name):
+    block = listRequest(name)
+    block[0] = 0x02
+    return block
+
+def transmitRequest(name, length):
+    block = bytearray(90)
+    block[0:7] = b'\x03\x00\x70\x0c\x7a\x21\x32'
+    block[7:11] = length.to_bytes(4, 'little')
+    name = _name(name)
+    block[11:11+len(name)] = name
+    return block
+
+def frame(data, length):
+    """
+    bytes the host sends after the Portfolio's 'Z': 0xA5, the length and
+    the data, closed by a checksum byte the Portfolio echoes on success
+    """
+    block = bytearray(length + 4)
+    block[0] = 0xa5
+    block[1] = length & 0xff
+    block[2] = length >> 8
+    block[3:3+length] = data[:length]
+    block[-1] = (0xa5 - nibble.checksum(block)) & 0xff
+    return block
+
+def frameLength(header, maxLen):
+    """length announced by the three header bytes the Portfolio sends"""
+    if header[0] != 0xa5:
+        raise pofoprotoAckError(f"Ack ERR (got {header[0]:02x} instead of 0xA5)")
+    length = header[1] | (header[2] << 8)
+    if length > maxLen:
+        # the Portfolio never sends more than the request allows, so the
+        # length was garbled on the way
+        raise pofoprotoAckError(f"Receive Buffer too small ({maxLen} instead of {length} bytes)")
+    return length
+
+def frameEcho(header, data):
+    """
+    check a received block, data ends with the checksum byte,
+    returns the byte to echo to the Portfolio
+    """
+    checksum = (header[1] + header[2] + nibble.checksum(data[:-1])) & 0xff
+    if ((0x100 - data[-1]) & 0xff) != checksum:
+        raise pofoprotoChecksumError(f"checksum ERR {(0x100-data[-1]) & 0xff:02x} vs {checksum:02x}")
+    return data[-1]
+
+def parseListing(reply):
+    """file names of a listing reply: a 16 bit count and NUL terminated names"""
+    num = reply[0] | (reply[1] << 8)
+    # decoded straight from the received buffer, only up to the last name
+    names = str(reply[2:], 'latin-1').split('\x00', num)[:num]
+    if len(names) != num or not all(names):
+        raise pofoprotoException(f"Listing announces {num} files, got {len(names)}")
+    return names
+
+def listFiles(pattern):
+    """operation returning the names of all files matching pattern"""
+    yield ('send', listRequest(pattern))
+    reply = yield ('recv', PAYLOAD_BUFSIZE)
+    return parseListing(reply)
+
+def receiveFiles(pattern, names=None, first=0):
+    """
+    operation receiving all files matching pattern, returns their names,
+    names is a listing of pattern known from before, it saves the round trip;
+    first skips the files before it, e.g. after a retry, the file events
+    still count in the whole listing
+    """
+    if names is None:
+        yield ('send', listRequest(pattern))
+        names = parseListing((yield ('recv', LIST_BUFSIZE)))
+    if not names:
+        raise pofoprotoException(f"File not found on Portfolio: {pattern}")
+    # the file names replace the last component of the pattern
+    pos = max(pattern.rfind('\\'), pattern.rfind(':')) + 1
+    for i in range(first, len(names)):
+        name = names[i]
+        wanted = yield ('file', name, i, len(names))
+        if not wanted:
+            continue
+        yield ('send', receiveRequest(pattern[:pos] + name))
+        control = yield ('recv', CONTROL_BUFSIZE)
+        if control[0] != 0x20:
+            raise pofoprotoException("Unkown protocol error!")
+        total = control[7] | (control[8] << 8) | (control[9] << 16)
+        yield ('size', total, control[1] | (control[2] << 8))
+        while total > 0:
+            chunk = yield ('recv', PAYLOAD_BUFSIZE)
+            if not len(chunk):
+                raise pofoprotoException("Empty payload block!")
+            yield ('data', chunk)
+            total -= len(chunk)
+        yield ('send', RECEIVE_FINISH)
+        yield ('done', name)
+    return names
+
+def transmitFile(name, length):
+    """
+    operation sending length bytes to name on the Portfolio,
+    returns False when an existing file was not overwritten
+    """
+    if length > MAX_TRANSMIT:
+        raise pofoprotoException(f"File too large ({length} bytes)")
+    yield ('send', transmitRequest(name, length))
+    control = yield ('recv', CONTROL_BUFSIZE)
+    if control[0] == 0x10:
+        raise pofoprotoException(f"Invalid destination file! dest:{name}")
+    if control[0] == 0x20:
+        if not (yield ('exists', name)):
+            yield ('send', TRANSMIT_CANCEL)
+            return False
+        yield ('send', TRANSMIT_OVERWRITE)
+    blocksize = control[1] | (control[2] << 8)
+    if not blocksize or blocksize > PAYLOAD_BUFSIZE:
+        raise pofoprotoException("Payload Buffer too small")
+    yield ('size', length, blocksize)
+    while length > 0:
+        size = min(length, blocksize)
+        chunk = yield ('read', size)
+        if len(chunk) != size:
+            raise pofoprotoException("Source file changed while transmitting")
+        yield ('send', chunk)
+        length -= size
+    control = yield ('recv', CONTROL_BUFSIZE)
+    if control[0] != 0x20:
+        raise pofoprotoException(f"ERR{control[0]:02x}:Transmission failed!\nDisk Full or target directory not existant?")
+    return True
@@ -0,0 +1,685 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+A synchronized link to one Portfolio.
+
+PortfolioSession owns a port backend, the payload buffer and the sync
+state of the link, and runs any number of list, get and put operations
+over it.  The link is synchronized (the 0x50 handshake) before the first
+operation and again after an operation failed half way, then clocking a
+Portfolio stuck in a block on for at most timeout seconds; in between the
+Portfolio simply waits for the next control block.
+
+    session = PortfolioSession(usb2lpt.usb2lpt())
+    session.list('C:\\*.*')
+    session.get('C:\\*.TXT', 'backup')
+    session.put('notes.txt', 'C:\\NOTES.TXT', force=True)
+
+Messages for the user go through log, print by default.  The byte loops
+count into progress, a progress.transferProgress a reporter may sample
+from another thread.  A session handed a linktrace.linkTrace records the
+link in it, from port accesses up to blocks, and dumps it when an
+operation fails; without one no traced method is installed.  observer, when
+set, sees every file event of an operation before it is handled (see
+pofoproto), e.g. to report progress.  cancel() may be called from any
+thread, the running operation stops at the next control block and raises
+pofosessionCancelled with the link still in sync.
+
+A garbled block (pofoproto.pofoprotoLinkError), a Portfolio gone silent
+(lptport.lptportTimeout) or too slow for a batch (nibble.nibbleException)
+does not end an operation right away: the link is
+synchronized again and the listing, the file being sent or the file being
+received is repeated, up to retries times.  linkstats counts the retries.
+
+Errors are raised: pofosessionException for refused requests, pofoproto.pofoprotoException for
+protocol errors, lptport.lptportException for port errors and timeouts and
+OSError for local files.
+"""
+import hashlib
+import os
+import fileio
+import linktrace
+import lptport
+import mirror
+import nibble
+import pofoproto
+import progress
+import simpofo
+import usb2lpt
+import time
+
+BATCH_BYTES = 64
+RETRIES = 3     # repetitions of a listing or file after link errors
+SYNC_NUDGE = 0.1    # seconds of silence after which a resync clocks the Portfolio on
+
+# errors after which the link is synchronized and the operation repeated,
+# a batch missing an acknowledge left the Portfolio somewhere in a byte
+RECOVERABLE = (pofoproto.pofoprotoLinkError, lptport.lptportTimeout, nibble.nibbleException)
+
+class pofosessionException(Exception):
+    pass
+
+class pofosessionCancelled(pofosessionException):
+    pass
+
+# everything an operation may raise besides OSError
+ERRORS = (
+    pofosessionException,
+    pofoproto.pofoprotoException,
+    lptport.lptportException,
+    nibble.nibbleException,
+    fileio.fileioException,
+    mirror.mirrorException,
+    )
+
+def openPort(dev):
+    """
+    the port backend of a device name: "sim" or "sim:DIR" selects the
+    simulated Portfolio, seeded from DIR, any other name a usb2lpt
+    device, None the usb2lpt autodetect
+    """
+    if type(dev) is str and (dev == 'sim' or dev.startswith('sim:')):
+        return simpofo.simpofo(dev[4:] or None)
+    if type(dev) is str:
+        return usb2lpt.usb2lpt(dev)
+    return usb2lpt.usb2lpt()
+
+def listingKey(pattern):
+    # the Portfolio ignores case
+    return pattern.replace('/','\\').upper()
+
+def composePofoName(source, dest, sourcecount):
+    """Portfolio path for the local file source sent to dest"""
+    pofoName = dest.replace('/','\\')
+
+    lastChar = pofoName[-1]
+    if sourcecount > 1 or lastChar == '\\' or lastChar == ':':
+        # DEST is a directory, append the 8.3 name of the source
+        if lastChar != '\\':
+            pofoName += '\\'
+
+        pos = max(source.rfind('/'), source.rfind('\\')) + 1
+        ext = source.rfind('.')
+        if ext > pos:
+            # DOS allows one dot, the ones before the extension become _
+            base = source[pos:ext].replace('.','_')
+            length = max(0, min(8, pofoproto.MAX_FILENAME_LEN-len(pofoName)))
+            pofoName += base[:length]
+            length = max(0, min(4, pofoproto.MAX_FILENAME_LEN-len(pofoName)))
+            pofoName += source[ext:ext+length]
+        else:
+            length = max(0, min(8, pofoproto.MAX_FILENAME_LEN-len(pofoName)))
+            pofoName += source[pos:pos+length]
+
+    return pofoName
+
+class PortfolioSession:
+    verbose = 0
+    slomo = False
+
+    def __init__(self, port, batch=0, polls=8, timeout=10.0, stats=None, shadow=False, log=print,
+                 retries=RETRIES, trace=None):
+        self.port = port
+        self.batch = batch      # bytes per IOCTL_VLPT_OutIn program, 0 means one ioctl per port access
+        self.polls = polls      # status reads per handshake step inside a program
+        self.timeout = timeout  # seconds to wait for the Portfolio's clock, None waits forever
+        self.stats = stats      # linkstats.linkstats collecting the performance counters
+        self.log = log
+        self.retries = retries  # repetitions of an operation after link errors
+        self.payload = bytearray(pofoproto.PAYLOAD_BUFSIZE)
+        self.listings = {}      # names of every pattern listed, until the next put or job
+        self.synced = False
+        self.lost = False       # the sync was lost by a failed operation
+        self.progress = progress.transferProgress()
+        self.observer = None    # called with every file event of an operation
+        self.cancelled = False  # the running operation stops at the next control block
+        self.trace = None
+        if stats:
+            port.enableStats(stats)
+        if trace:
+            self.enableTrace(trace)
+        if shadow:
+            # after enableStats, dropped writes are no ioctls
+            port.enableShadow()
+
+    def enableTrace(self, trace):
+        """
+        record the link in a linktrace.linkTrace, from the port accesses
+        up to the blocks, the trace is dumped when an operation fails
+        """
+        self.trace = trace
+        self.port.enableTrace(trace)
+        # the traced methods shadow the plain ones of the class
+        self.waitClockHigh = trace.traceResult(self.waitClockHigh, linktrace.WAIT_HIGH)
+        self.waitClockLow = trace.traceResult(self.waitClockLow, linktrace.WAIT_LOW)
+        self.getBit = trace.traceResult(self.getBit, linktrace.GET_BIT)
+        self.receiveByte = trace.traceResult(self.receiveByte, linktrace.RECEIVE_BYTE)
+        self.sendByte = trace.traceArgument(self.sendByte, linktrace.SEND_BYTE)
+        self.sendBlock = trace.traceArgument(self.sendBlock, linktrace.SEND_BLOCK, 1)
+        self.receiveBlock = trace.traceResult(self.receiveBlock, linktrace.RECEIVE_BLOCK)
+
+    def dumpTrace(self, error):
+        if self.trace:
+            self.trace.record(linktrace.ERROR, -1)
+            self.trace.dump(f"{type(error).__name__}: {error}")
+
+    # bit level
+
+    def waitClockHigh(self):
+        return self.port.waitStatus(0x20, 0x20, self.timeout)
+
+    def waitClockLow(self):
+        return self.port.waitStatus(0x20, 0, self.timeout)
+
+    def getBit(self):
+        return (self.port.inStatus() & 0x10) >> 4
+
+    def receiveByte(self):
+        port = self.port
+        byte = 0
+        for i in range(4):
+            self.waitClockLow()
+            byte = (byte << 1) | self.getBit()
+            port.outData(0)
+            self.waitClockHigh()
+            byte = (byte << 1) | self.getBit()
+            port.outData(2)
+        return byte
+
+    def sendByte(self, byte):
+        port = self.port
+        if type(byte) == str:
+            byte = bytes(byte,'utf-8')[0]
+        time.sleep(0.001) if self.slomo else None
+        time.sleep(0.05) if self.slomo else None
+        outs = nibble.SEND_TABLE[byte]
+        for i in range(0, 16, 4):
+            port.outData(outs[i])
+            port.outData(outs[i+1])
+            self.waitClockLow()
+            port.outData(outs[i+2])
+            port.outData(outs[i+3])
+            self.waitClockHigh()
+
+    def clockEdges(self, samples, count):
+        # every step has to show the Portfolio's acknowledge in one of its polls,
+        # otherwise the following write of the program went out too early
+        try:
+            return nibble.clockEdges(samples, count, self.polls)
+        except nibble.nibbleException as e:
+            raise nibble.nibbleException(f"{e}: Portfolio too slow for batched transfer, raise --polls or drop -b")
+
+    def sendBytes(self, data):
+        port = self.port
+        batch = self.batch
+        counter = self.progress
+        if not batch:
+            outs = nibble.encode(data)
+            for byte in range(0, len(outs), 16):
+                for i in range(byte, byte+16, 4):
+                    port.outData(outs[i])
+                    port.outData(outs[i+1])
+                    self.waitClockLow()
+                    port.outData(outs[i+2])
+                    port.outData(outs[i+3])
+                    self.waitClockHigh()
+                counter.bytes += 1
+            return
+        polls = self.polls
+        for start in range(0, len(data), batch):
+            chunk = data[start:start+batch]
+            prog = lptport.lptProgram()
+            code = nibble.encodeProgram(chunk, polls)
+            # split between bytes where the program exceeds an ioctl
+            prog.extend(code, 8*polls*len(chunk), len(code) // len(chunk))
+            self.clockEdges(port.runProgram(prog), len(chunk))
+            counter.bytes += len(chunk)
+
+    def receiveBytes(self, count):
+        batch = self.batch
+        counter = self.progress
+        if not batch:
+            data = bytearray(count)
+            for i in range(count):
+                data[i] = self.receiveByte()
+                counter.bytes += 1
+            return data
+        polls = self.polls
+        data = bytearray()
+        code = nibble.receiveProgram(polls)
+        for start in range(0, count, batch):
+            n = min(batch, count-start)
+            prog = lptport.lptProgram()
+            prog.extend(code * n, 8*polls*n, len(code))
+            data += nibble.decode(self.clockEdges(self.port.runProgram(prog), n))
+            counter.bytes += n
+        return data
+
+    # block level
+
+    def sendBlock(self, pData, length):
+        stats = self.stats
+        if length:
+            if stats:
+                start = time.perf_counter()
+                ioctls = stats.ioctls
+            byte = self.receiveByte()
+            if chr(byte) == 'Z':
+                self.log("Portfolio ready for receiving.") if self.verbose else None
+            else:
+                raise pofoproto.pofoprotoNotReady("Portfolio not ready!")
+            time.sleep(0.05) if self.slomo else None  # = usleep(50000)
+            # the whole frame goes out as one flat sequence
+            frame = pofoproto.frame(pData, length)
+            self.sendBytes(frame)
+            self.log(f"Sent {length:06d} of {length:06d} bytes.") if self.verbose else None
+            if self.receiveByte() != frame[-1]:
+                raise pofoproto.pofoprotoChecksumError("Checksum Error")
+            self.log("Checksum OK") if self.verbose else None
+            self.progress.blocks += 1
+            if stats:
+                stats.addBlock('send', length, time.perf_counter()-start, stats.ioctls-ioctls)
+
+    def receiveBlock(self, pData, maxLen):
+        stats = self.stats
+        if stats:
+            start = time.perf_counter()
+            ioctls = stats.ioctls
+        self.sendByte(ord('Z'))
+        header = self.receiveBytes(3)
+        length = pofoproto.frameLength(header, maxLen)
+        self.log("Ack OK") if self.verbose else None
+        data = self.receiveBytes(length+1)
+        pData[:length] = memoryview(data)[:length]
+        self.log(f"Received {length:06d} of {length:06d} bytes") if self.verbose else None
+        try:
+            echo = pofoproto.frameEcho(header, data)
+        except pofoproto.pofoprotoChecksumError:
+            # a wrong echo makes the Portfolio drop the block as well
+            self.sendByte(~data[-1] & 0xff)
+            raise
+        self.log("checksum OK") if self.verbose else None
+        time.sleep(0.0001) if self.slomo else None
+        self.sendByte(echo)
+        self.progress.blocks += 1
+        if stats:
+            stats.addBlock('receive', length, time.perf_counter()-start, stats.ioctls-ioctls)
+        return length
+
+    # link level
+
+    def synchronize(self, timeout=None):
+        """
+        the 0x50 handshake, clocking bit by bit until the Portfolio's
+        announcement comes through; by default it waits forever, the
+        Portfolio may not be in server mode yet.  With a timeout the link
+        was in use before: a Portfolio still waiting for bits of a block
+        is clocked on until it gives up and announces itself again, after
+        timeout seconds lptport.lptportTimeout is raised
+        """
+        self.log("Waiting for Portfolio...")
+        limit = self.timeout
+        deadline = None
+        if timeout is not None:
+            deadline = time.perf_counter() + timeout
+            self.timeout = SYNC_NUDGE
+        else:
+            self.timeout = None
+        port = self.port
+        try:
+            port.outData(2)
+            if deadline is None:
+                # a Portfolio just started announces itself with its clock high
+                self.waitClockHigh()
+            while True:
+                try:
+                    byte = self.receiveByte()
+                    while byte != 0x50:
+                        self.waitClockLow()
+                        port.outData(0)
+                        self.waitClockHigh()
+                        port.outData(2)
+                        byte = self.receiveByte()
+                    break
+                except lptport.lptportTimeout:
+                    if time.perf_counter() > deadline:
+                        raise
+                    # the Portfolio waits for us, hand it two bits
+                    try:
+                        port.outData(0)
+                        self.waitClockLow()
+                        port.outData(2)
+                        self.waitClockHigh()
+                    except lptport.lptportTimeout:
+                        port.outData(2)
+        finally:
+            self.timeout = limit
+        self.synced = True
+        self.lost = False
+        if self.trace:
+            self.trace.record(linktrace.SYNC, 0x50)
+
+    def resynchronize(self):
+        """
+        synchronize unless in sync: the first time waiting for the
+        Portfolio as long as it takes, after a failed operation clocking
+        a Portfolio stuck in a block on, for timeout seconds
+        """
+        if self.synced:
+            return
+        if not self.lost:
+            self.synchronize()
+        else:
+            self.synchronize(self.timeout if self.timeout is not None else float('inf'))
+
+    def cancel(self):
+        """
+        stop the running operation where the protocol allows it: before
+        its next request, at an existing destination (the transmit is
+        cancelled) or before the next file of a receive; a file whose
+        blocks are already flowing runs to its end; every following
+        operation is refused until cancelled is cleared again
+        """
+        self.cancelled = True
+
+    def runOperation(self, op, handle=None):
+        """
+        drive a pofoproto operation over the link, every event besides send
+        and recv is passed to handle, which returns the reply
+        """
+        if self.cancelled:
+            raise pofosessionCancelled("Transfer cancelled")
+        self.resynchronize()
+        reply = None
+        declined = False
+        try:
+            while True:
+                event = op.send(reply)
+                if event[0] == 'send':
+                    self.sendBlock(event[1], len(event[1]))
+                    reply = None
+                elif event[0] == 'recv':
+                    length = self.receiveBlock(self.payload, event[1])
+                    reply = memoryview(self.payload)[:length]
+                else:
+                    self.progress.event(event)
+                    if self.observer:
+                        self.observer(event)
+                    if self.cancelled and event[0] in ('file', 'exists'):
+                        # declined files and destinations end the operation
+                        # the protocol's own way, the link stays in sync
+                        reply = False
+                        declined = True
+                    else:
+                        reply = handle(event) if handle else None
+        except StopIteration as e:
+            if declined:
+                raise pofosessionCancelled("Transfer cancelled")
+            return e.value
+        except BaseException as e:
+            # the Portfolio may be anywhere in the protocol now
+            self.synced = False
+            self.lost = True
+            if self.trace and isinstance(e, Exception):
+                self.dumpTrace(e)
+            raise
+
+    def recover(self, fn, position=None):
+        """
+        call fn, after a recoverable link error synchronize again and
+        call it again, at most retries times; position, if given, tells
+        how far fn got, e.g. the files done, every advance of it starts
+        the retries anew
+        """
+        attempt = 0
+        last = position() if position else None
+        while True:
+            try:
+                return fn()
+            except RECOVERABLE as e:
+                if position and position() != last:
+                    last = position()
+                    attempt = 0
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                self.log(f"{e}: retry {attempt} of {self.retries}")
+                if self.stats:
+                    self.stats.addRetry(e)
+                self.resynchronize()
+
+    # operations
+
+    def list(self, pattern):
+        """names of the files matching pattern"""
+        key = listingKey(pattern)
+        names = self.listings.get(key)
+        if names is None:
+            self.resynchronize()
+            self.log(f"Sending List files request for pattern {pattern}")
+            names = self.recover(lambda: self.runOperation(pofoproto.listFiles(pattern)))
+            self.listings[key] = names
+        return names
+
+    def put(self, src, dest, force=False, source=None, manifest=None, journal=None):
+        """
+        transmit the local file src to dest on the Portfolio, source is src
+        already opened as fileio.transmitSource, manifest a mirror.pushManifest
+        to skip content pushed before, journal a mirror.batchJournal to skip
+        a file completed in an interrupted run and to record this one;
+        returns True if the file was sent
+        """
+        # any listing may now be missing the new file
+        self.listings.clear()
+        if source is None:
+            source = fileio.transmitSource(src)
+        with source:
+            length = source.size
+            if length > pofoproto.MAX_TRANSMIT:
+                self.log(f"Skipping {src}")
+                return False
+            if journal:
+                size = journal.completed(dest.upper(), src)
+                if size is not None:
+                    self.log("Completed in the interrupted run, skipped.")
+                    journal.skip(size)
+                    return False
+            if manifest:
+                size, digest = manifest.digest(src)
+                if manifest.unchanged(dest, size, digest):
+                    self.log("Unchanged since the last push, skipped.")
+                    manifest.skip(size)
+                    return False
+
+            started = False
+            checksum = None
+
+            def handle(event):
+                nonlocal started
+                if event[0] == 'exists':
+                    if force:
+                        self.log("File exists on Portfolio and is being overwritten!")
+                        return True
+                    if started:
+                        # what a failed attempt left behind
+                        return True
+                    self.log("File exists on Portfolio! Use -f to force overwriting.")
+                    return False
+                elif event[0] == 'size':
+                    started = True
+                    total, blocksize = event[1:]
+                    if total > blocksize:
+                        self.log(f"Transmission consists of {(total+blocksize-1)//blocksize} blocks of payload.")
+                elif event[0] == 'read':
+                    chunk = source.read(event[1])
+                    if checksum:
+                        checksum.update(chunk)
+                    return chunk
+
+            def transmit():
+                nonlocal checksum
+                source.rewind()
+                checksum = hashlib.sha256() if journal else None
+                return self.runOperation(pofoproto.transmitFile(dest, length), handle)
+
+            sent = self.recover(transmit)
+        if sent and manifest:
+            manifest.record(dest, size, digest)
+        if sent and journal:
+            journal.record(dest.upper(), src, length, checksum.hexdigest())
+        return sent
+
+    def get(self, pattern, dest, force=False, mapped=False, writer=None, mirrored=False, journal=None):
+        """
+        receive the files matching pattern to dest, a directory or, for a
+        single file, a file name; mapped and writer are passed to the
+        fileio.receiveSink of every file, mirrored only fetches files
+        changed since the last pull into the mirror directory dest,
+        journal is a mirror.batchJournal holding the listing and the files
+        completed by an interrupted run, this run's are recorded in it;
+        returns the names of the matching files
+        """
+        destIsDir = os.path.isdir(dest)
+        state = None
+        if mirrored:
+            if not destIsDir:
+                raise pofosessionException(f"Mirroring requires a directory as DEST: {dest}")
+            state = mirror.mirrorState(dest)
+        # the listing names replace the last component of the pattern
+        prefix = listingKey(pattern[:max(pattern.rfind('\\'), pattern.rfind(':'))+1])
+        names = journal.listing(listingKey(pattern)) if journal else None
+        if names is None:
+            names = self.list(pattern)
+            if journal:
+                journal.listed(listingKey(pattern), names)
+        if not names:
+            raise pofoproto.pofoprotoException(f"File not found on Portfolio: {pattern}")
+        if not force and not mirrored:
+            # refuse before anything is transferred
+            for name in names:
+                path = os.path.join(dest, name) if destIsDir else dest
+                if journal and journal.completed(prefix + name.upper(), path) is not None:
+                    # completed before and untouched since, it is skipped
+                    continue
+                if os.path.exists(path):
+                    raise pofosessionException(f"File exists! Use -f to force overwriting: {path}")
+        pulled = []
+        sink = None
+        current = None
+        checksum = None
+        done = 0    # files received or skipped, a retry continues after them
+
+        def handle(event):
+            nonlocal sink, current, checksum, done
+            if event[0] == 'file':
+                name, i, num = event[1:]
+                self.log(f"Transferring file {i+1} of {num}: {name}")
+                path = os.path.join(dest, name) if destIsDir else dest
+                if journal:
+                    size = journal.completed(prefix + name.upper(), path)
+                    if size is not None:
+                        self.log("Completed in the interrupted run, skipped.")
+                        journal.skip(size)
+                        done += 1
+                        return False
+                    checksum = hashlib.sha256()
+                if state:
+                    size = state.unchanged(prefix + name.upper(), path)
+                    if size is not None:
+                        self.log("Local copy unchanged since the last pull, skipped.")
+                        state.skip(size)
+                        done += 1
+                        return False
+                current = [prefix + name.upper(), path, 0]
+                sink = fileio.receiveSink(path, mapped, writer)
+                return True
+            elif event[0] == 'size':
+                total, blocksize = event[1:]
+                if total > blocksize:
+                    self.log(f"Transmission consists of {(total+blocksize-1)//blocksize} blocks of payload")
+                sink.allocate(total)
+                current[2] = total
+            elif event[0] == 'data':
+                sink.write(event[1])
+                if checksum:
+                    checksum.update(event[1])
+            elif event[0] == 'done':
+                sink.close()
+                pulled.append(current)
+                if journal:
+                    journal.record(current[0], current[1], current[2], checksum.hexdigest())
+                done += 1
+
+        def receive():
+            try:
+                self.runOperation(pofoproto.receiveFiles(pattern, names, done), handle)
+            finally:
+                # an interrupted file never shows up under its real name
+                if sink:
+                    sink.abort()
+
+        # every file gets retries attempts of its own
+        self.recover(receive, lambda: done)
+        if state:
+            if writer:
+                # the state holds the mtimes of the finished files
+                writer.flush()
+            for key, path, size in pulled:
+                state.record(key, path, size)
+            state.save()
+            self.log(f"Mirrored {len(pulled)} files, skipped {state.skipped} with an unchanged local copy, "
+                     f"{state.saved} bytes saved.")
+        return names
+
+    def runJob(self, job):
+        """
+        run a job given as dict, as sent to pytransd or listed for the
+        scheduler: {'op': 'list', 'pattern'}, {'op': 'get', 'pattern', 'dest',
+        'force', 'mirror'} or {'op': 'put', 'sources', 'dest', 'force'};
+        returns the names listed, received or sent
+        """
+        # a job may come long after the last one, the Portfolio's files
+        # may have changed in between
+        self.listings.clear()
+        op = job.get('op')
+        if op == 'list':
+            return self.list(job['pattern'])
+        elif op == 'get':
+            return self.get(job['pattern'], job['dest'], job.get('force', False),
+                            mirrored=job.get('mirror', False))
+        elif op == 'put':
+            sources = job['sources']
+            sent = []
+            for i, src in enumerate(sources):
+                pofoName = composePofoName(src, job['dest'], len(sources))
+                self.log(f"Transmitting {src} -> {pofoName}")
+                self.progress.startFile(pofoName, i, len(sources))
+                if self.put(src, pofoName, job.get('force', False)):
+                    sent.append(pofoName)
+            return sent
+        raise pofosessionException(f"Unknown job {op!r}")
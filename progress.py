@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Progress of a transfer, reported away from the link.
+
+The link code only counts: transferProgress holds plain numbers, the byte
+loops of PortfolioSession add to bytes, the file events of an operation
+set the file being transferred.  A progressReporter thread samples them
+at most every interval seconds and hands a record to its sinks:
+
+  {'name', 'file', 'files', 'done', 'total', 'block', 'blocks',
+   'rate', 'eta', 'elapsed', 'final'}
+
+file counts from 1, done and total are bytes of the current file, rate is
+bytes per second over the link, eta seconds left for the current file or
+None.  ttySink draws a status line, jsonSink writes JSON lines, to stderr
+by default so they stay apart from the messages of pytrans, any other
+callable taking the record works as a sink as well.
+"""
+import json
+import sys
+import threading
+import time
+
+REPORT_INTERVAL = 0.25  # seconds between two records at most
+SMOOTHING = 0.3         # weight of the latest interval in the rate
+
+class transferProgress:
+
+    def __init__(self):
+        self.bytes = 0          # bytes over the link, counted by the byte loops
+        self.blocks = 0         # blocks over the link
+        self.name = None
+        self.file = 0
+        self.files = 0
+        self.total = 0          # length of the current file
+        self.blocksize = 0
+        self.base = 0           # bytes and blocks when the current file started
+        self.baseBlocks = 0
+
+    def startFile(self, name, i, num):
+        """file i (0 based) of num is next, for operations without file events"""
+        self.name, self.file, self.files = name, i + 1, num
+        self.total = self.blocksize = 0
+        self.base, self.baseBlocks = self.bytes, self.blocks
+
+    def event(self, event):
+        # the file events of a pofoproto operation, no data ones
+        if event[0] == 'file':
+            self.startFile(*event[1:])
+        elif event[0] == 'size':
+            self.total, self.blocksize = event[1:]
+            self.base, self.baseBlocks = self.bytes, self.blocks
+
+class progressReporter:
+    """samples a transferProgress in a thread of its own and feeds sinks"""
+
+    def __init__(self, progress, sinks, interval=REPORT_INTERVAL):
+        self.progress = progress
+        self.sinks = sinks
+        self.interval = interval
+        self.start = self.last = time.perf_counter()
+        self.lastBytes = progress.bytes
+        self.lastState = None
+        self.rate = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.report()
+
+    def report(self, final=False):
+        p = self.progress
+        now = time.perf_counter()
+        count = p.bytes
+        if now > self.last:
+            rate = (count - self.lastBytes) / (now - self.last)
+            self.rate = rate if self.rate is None else SMOOTHING * rate + (1 - SMOOTHING) * self.rate
+        self.last, self.lastBytes = now, count
+        state = (p.file, p.name, count)
+        if state == self.lastState and not final:
+            # nothing moved, e.g. waiting for the Portfolio
+            return
+        self.lastState = state
+        done = min(count - p.base, p.total) if p.total else 0
+        blocks = (p.total + p.blocksize - 1) // p.blocksize if p.blocksize else 0
+        record = {
+            'name': p.name,
+            'file': p.file,
+            'files': p.files,
+            'done': done,
+            'total': p.total,
+            'block': min(p.blocks - p.baseBlocks, blocks),
+            'blocks': blocks,
+            'rate': self.rate or 0.0,
+            'eta': (p.total - done) / self.rate if self.rate else None,
+            'elapsed': now - self.start,
+            'final': final,
+            }
+        for sink in self.sinks:
+            sink(record)
+
+    def close(self):
+        """stop sampling and report the final state"""
+        self.stopped.set()
+        self.thread.join()
+        self.report(final=True)
+
+class ttySink:
+    """one status line, redrawn in place, a new one for every file"""
+
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+        self.file = None
+        self.width = 0
+
+    def __call__(self, record):
+        if self.file is not None and record['file'] != self.file:
+            self.stream.write('\n')
+            self.width = 0
+        self.file = record['file']
+        eta = record['eta']
+        line = (f"{record['file']}/{record['files']} {record['name'] or ''} "
+                f"{record['done']}/{record['total']} bytes, block {record['block']}/{record['blocks']}, "
+                f"{record['rate']:.0f} B/s"
+                + (f", ETA {int(eta)//60}:{int(eta)%60:02d}" if eta is not None else ''))
+        self.stream.write('\r' + line.ljust(self.width))
+        self.width = len(line)
+        if record['final']:
+            self.stream.write('\n')
+        self.stream.flush()
+
+class jsonSink:
+    """every record as a JSON line"""
+
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+
+    def __call__(self, record):
+        self.stream.write(json.dumps(record) + '\n')
+        self.stream.flush()
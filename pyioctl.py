@@ -34,7 +34,11 @@ python3 conversion by Carsten Busse 2022
 """
 import ctypes
 import ctypes.wintypes as wintypes
-from ctypes import windll
+try:
+    from ctypes import windll
+except ImportError:
+    # not on Windows: the module still imports, opening a device fails
+    windll = None
 
 LPDWORD = ctypes.POINTER(wintypes.DWORD)
 LPOVERLAPPED = wintypes.LPVOID
@@ -83,12 +87,16 @@ def _CreateFile(filename, access, mode, creation, flags):
                          NULL))
 
 
-def _DeviceIoControl(devhandle, ioctl, inbuf, inbufsiz, outbuf, outbufsiz):
-    """See: DeviceIoControl function
-    http://msdn.microsoft.com/en-us/library/aa363216(v=vs.85).aspx
+_DeviceIoControl_Fn = None
+
+def _DeviceIoControlPrototype():
+    """DeviceIoControl bound once to its own prototype, so the hot path
+    neither looks it up nor reassigns argtypes/restype per call
     """
-    DeviceIoControl_Fn = windll.kernel32.DeviceIoControl
-    DeviceIoControl_Fn.argtypes = [
+    global _DeviceIoControl_Fn
+    if _DeviceIoControl_Fn is None:
+        prototype = ctypes.WINFUNCTYPE(
+            wintypes.BOOL,                      # BOOL
             wintypes.HANDLE,                    # _In_          HANDLE hDevice
             wintypes.DWORD,                     # _In_          DWORD dwIoControlCode
             wintypes.LPVOID,                    # _In_opt_      LPVOID lpInBuffer
@@ -96,12 +104,23 @@ def _DeviceIoControl(devhandle, ioctl, inbuf, inbufsiz, outbuf, outbufsiz):
             wintypes.LPVOID,                    # _Out_opt_     LPVOID lpOutBuffer
             wintypes.DWORD,                     # _In_          DWORD nOutBufferSize
             LPDWORD,                            # _Out_opt_     LPDWORD lpBytesReturned
-            LPOVERLAPPED]                       # _Inout_opt_   LPOVERLAPPED lpOverlapped
-    DeviceIoControl_Fn.restype = wintypes.BOOL
+            LPOVERLAPPED,                       # _Inout_opt_   LPOVERLAPPED lpOverlapped
+            use_last_error=True)
+        _DeviceIoControl_Fn = prototype(('DeviceIoControl', windll.kernel32))
+    return _DeviceIoControl_Fn
+
+def _DeviceIoControl(devhandle, ioctl, inbuf, inbufsiz, outbuf, outbufsiz, lpBytesReturned=None):
+    """See: DeviceIoControl function
+    http://msdn.microsoft.com/en-us/library/aa363216(v=vs.85).aspx
+    """
+    DeviceIoControl_Fn = _DeviceIoControlPrototype()
 
-    # allocate a DWORD, and take its reference
-    dwBytesReturned = wintypes.DWORD(0)
-    lpBytesReturned = ctypes.byref(dwBytesReturned)
+    if lpBytesReturned is None:
+        # allocate a DWORD, and take its reference
+        dwBytesReturned = wintypes.DWORD(0)
+        lpBytesReturned = ctypes.byref(dwBytesReturned)
+    else:
+        dwBytesReturned = lpBytesReturned._obj
 
     status = DeviceIoControl_Fn(devhandle,
                   ioctl,
@@ -121,6 +140,10 @@ class DeviceIoControl(object):
     def __init__(self, path):
         self.path = path
         self._fhandle = None
+        # reused by every call of this device
+        self.bytesReturned = wintypes.DWORD(0)
+        self.lpBytesReturned = ctypes.byref(self.bytesReturned)
+        self.fn = None
 
     def _validate_handle(self):
         if self._fhandle is None:
@@ -131,9 +154,11 @@ class DeviceIoControl(object):
 
     def ioctl(self, ctl, inbuf, inbufsiz, outbuf, outbufsiz):
         self._validate_handle()
-        return _DeviceIoControl(self._fhandle, ctl, inbuf, inbufsiz, outbuf, outbufsiz)
+        return _DeviceIoControl(self._fhandle, ctl, inbuf, inbufsiz, outbuf, outbufsiz, self.lpBytesReturned)
 
     def __enter__(self):
+        if windll is None:
+            raise DeviceIoControlException('DeviceIoControl requires Windows')
         self._fhandle = _CreateFile(
                 self.path,
                 GENERIC_READ | GENERIC_WRITE,
@@ -141,6 +166,7 @@ class DeviceIoControl(object):
                 OPEN_EXISTING,
                 FILE_ATTRIBUTE_NORMAL)
         self._validate_handle()
+        self.fn = _DeviceIoControlPrototype()
         return self
 
     def __exit__(self, typ, val, tb):
@@ -24,14 +24,20 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 """
-import os
+import fileio
+import linkstats
+import linktrace
+import lptport
+import mirror
+import pofosession
+import progress
 import usb2lpt
+import os
 import sys
-import time
 
 verbose = 0
 
-debug = False
+debug = False   # trace the link, the trace is dumped when a transfer fails
 
 slomo = False
 
@@ -41,6 +47,20 @@ device = 0
 
 sourcelist = None
 
+batch = 0   # bytes per IOCTL_VLPT_OutIn program, 0 means one ioctl per port access
+
+polls = 8   # status reads per handshake step inside a program
+
+stats = None    # linkstats.linkstats collecting the performance counters
+
+mapped = False  # write received files through a memory map
+
+shadow = False  # drop port writes that would not change the pins
+
+timeout = 10.0  # seconds to wait for the Portfolio's clock, None waits forever
+
+retries = pofosession.RETRIES   # repetitions of a listing or file after link errors
+
 """
 Example use of the usb2lpt class,
 requires:
@@ -51,420 +71,111 @@ requires:
   -  the HPC101 Parallel Port Interface of the Portfolio
   -  1:1 Parallel Port cable to connect the portfolio to the pc
 """
-CONTROL_BUFSIZE = 100
-LIST_BUFSIZE = 2000
-PAYLOAD_BUFSIZE = 60000
-MAX_FILENAME_LEN = 79
+BATCH_BYTES = pofosession.BATCH_BYTES
 
-receiveInit = bytearray([0x06, 0x00, 0x70] + [0x00]*79) #  size is 82
+sourcecount = 0
 
-receiveFinish = bytearray([0x20, 0x00, 0x03])
+prefetch = None # fileio.prefetcher opening the sources of a -t batch ahead
 
-transmitInit = bytearray([0x03, 0x00, 0x70, 0x0c, 0x7a, 0x21, 0x32] + [0x00]*83) # size is 90
+writer = None   # fileio.writeBehind doing the disk writes of -r
 
-controlData = bytearray(CONTROL_BUFSIZE)
+manifest = None # mirror.pushManifest of --changed-only
 
-listbuf = bytearray(LIST_BUFSIZE)
+deviceId = None # names the Portfolio in the push manifest, default the port
 
-payload = bytearray(PAYLOAD_BUFSIZE)
+mirrorMode = False  # -r only fetches files changed since the last pull
 
-transmitOverwrite = bytearray([0x05, 0x00, 0x70])
+session = None  # pofosession.PortfolioSession of this run
 
-transmitCancel = bytearray([0x00, 0x00, 0x00])
+resume = False  # continue the batch journal of an interrupted run
 
-listbuf = bytearray(LIST_BUFSIZE)
+journal = None  # mirror.batchJournal of a -t or -r batch
 
-sourcecount = 0
+progressMode = None # 'tty' or 'json' reports the progress of the transfer
 
-nReceivedFiles = 0
-
-def waitClockHigh():
-    byte = 0
-    while not byte:
-        print("waitClockHigh") if debug else None
-        byte = myport.inStatus() & 0x20
-
-def waitClockLow():
-    byte = 1
-    while byte:
-        print("waitClockLow") if debug else None
-        byte = myport.inStatus() & 0x20
-
-def getBit():
-    print("getbit") if debug else None
-    return (myport.inStatus() & 0x10) >> 4
-
-def receiveByte():
-    i = 0
-    byte = 0
-    print("Receive Byte") if verbose>1 else None
-    for i in range(4):
-        print(f"Receive bitBang i:{i}  byte:{byte:02x}",end='\r') if verbose>1 else None
-        waitClockLow()
-        byte = (byte << 1) | getBit()
-        myport.outData(0)
-        waitClockHigh()
-        byte = (byte << 1) | getBit()
-        myport.outData(2)
-    print("\n") if verbose>1 else None
-    return byte
-
-def sendByte(byte):
-    if type(byte) == str:
-        byte = bytes(byte,'utf-8')[0]
-    i = 0
-    b = 0
-    time.sleep(0.001) if slomo else None
-    print("Sending Byte") if debug else None
-    time.sleep(0.05) if slomo else None
-    for i in range(4):
-        print(f"Send bitBang i:{i} byte:{byte}",end='\r') if verbose>1 else None
-        b = ((byte & 0x80) >> 7) | 2
-        myport.outData(b)
-        b = (byte & 0x80) >> 7
-        myport.outData(b)
-
-
-        byte = byte << 1
-        waitClockLow()
-
-        b = (byte & 0x80) >> 7
-        myport.outData(b)
-        b = ((byte & 0x80) >> 7) | 2
-        myport.outData(b)
-
-        byte = byte << 1
-        waitClockHigh()
-
-def sendBlock(pData, length):
-    byte = 0
-    i = 0
-    lenH = lenL = 0
-    checksum = 0
-    if length:
-        byte = receiveByte()
-        if chr(byte) == 'Z':
-            print("Portfolio ready for receiving.") if verbose else None
-        else:
-            print("Portfolio not ready!") if verbose else None
-            exit(1)
-        time.sleep(0.05) if slomo else None  # = usleep(50000)
-        sendByte(0xa5)
-        lenH = length >> 8
-        lenL = length & 0xff
-        sendByte(lenL)
-        checksum -= lenL
-        sendByte(lenH)
-        checksum -= lenH
-        for i in range(length):
-            byte = pData[i]
-            sendByte(byte)
-            checksum -= byte
-            if verbose:
-                print(f"Sent {i+1:06d} of {length:06d} bytes.",end='\r')
-        sendByte(checksum&0xff)
-        print("\n") if verbose else None
-        byte = receiveByte()
-        if byte == checksum&0xff:
-            print("Checksum OK") if verbose else None
-        else:
-            print("Checksum Error") if verbose else None
-            exit(1)
-
-def receiveBlock(pData, maxLen):
-    length = i = 0
-    lenL = LenH = 0
-    checksum = 0
-    byte = 0
+progressPath = None # file of the JSON lines, stderr without
 
-    sendByte('Z')
-    byte = receiveByte()
+reporter = None # progress.progressReporter of this run
 
-    if byte == 0xa5:
-        print("Ack OK") if verbose else None
-    else:
-        print(f"Ack ERR (got {byte:02x} instead of 0xA5)") if verbose else None
-        exit(1)
-    lenL = receiveByte()
-    lenH = receiveByte()
-    checksum += lenL
-    checksum += lenH
-    length = (lenH << 8) | lenL
-    if length > maxLen:
-        print(f"Receive Buffer too small ({maxLen} instead of {length} bytes)") if verbose else None
-        return 0
-    
-    for i in range(length):
-        byte = receiveByte()
-        checksum += byte
-        pData[i] = byte
-        print(f"Received {i+1:06d} of {length:06d} bytes",end='\r') if verbose else None
-    print("\n") if verbose else None
-
-    byte = receiveByte()
-
-    if (0x100 - byte) == (checksum & 0xff):
-        print("checksum OK") if verbose else None
-    else:
-        print(f"checksum ERR {0x100-byte:02x} vs {checksum:02x}")
-        exit(1)
-    time.sleep(0.0001) if slomo else None
-    sendByte(256-(checksum&0xff))
-    #print()
-    return length
+ERRORS = pofosession.ERRORS    # everything an operation may raise besides OSError
 
 def transmitFile(src, dest):
-    val = length = blocksize = 0
     try:
-        fd = open(src,'rb')
+        source = prefetch.next(src) if prefetch else None
+        session.put(src, dest, force, source, manifest, journal)
     except FileNotFoundError:
         print(f"File not found: {src}")
         exit(1)
-    # No needto do some seek around the file in python to determine the size
-    length = os.path.getsize(src)
-    if (length == -1 or length > 32 * 2**20):
-        print(f"Skipping {src}")
-        return
-    transmitInit[7] = length & 0xff
-    transmitInit[8] = (length >> 8) & 0xff
-    transmitInit[9] = (length >> 16) & 0xff
-    transmitInit[10] = (length >> 24) & 0xff
-    for i in range(min(len(dest), MAX_FILENAME_LEN)):
-        transmitInit[11+i] = bytes(dest[i],'utf-8')[0]
-    sendBlock(transmitInit, len(transmitInit))
-    receiveBlock(controlData, CONTROL_BUFSIZE)
-
-    if controlData[0] == 0x10:
-        print(f"Invalid destination file! src:{src} dest:{dest}")
-        exit(1)
-
-    if controlData[0] == 0x20:
-        print("File exists on Portfolio",end='')
-        if (force):
-            print(" and is being overwritten!")
-            sendBlock(transmitOverwrite,len(transmitOverwrite))
-        else:
-            print("! Use -fd to force overwriting.")
-            sendBlock(transmitCancel, len(transmitCancel))
-            return
-
-    blocksize = controlData[1] | (controlData[2] << 8)
-    if blocksize > PAYLOAD_BUFSIZE:
-        print("Payload Buffer too small")
-        exit(1)
-
-    cb = (length+blocksize-1)/blocksize
-    if length > blocksize:
-        print(f"Transmission consists of {cb} blocks of payload.")
-    ci = 0
-    while length > blocksize:
-        print(f"Transmitting Block {ci:03d}/{ci:03d}", end='') if verbose else None
-        payload[:blocksize] = fd.read(blocksize)
-        sendBlock(payload, blocksize)
-        length -= blocksize
-        ci += 1
-    if length > 0:
-        payload[:length] = fd.read(length)
-        sendBlock(payload, length)
-    receiveBlock(controlData, CONTROL_BUFSIZE)
-    fd.close()
-
-    if controlData[0] != 0x20:
-        print(f"ERR{controlData[0]:02x}:Transmission failed!\nDisk Full or target directory not existant?")
+    except ERRORS + (OSError,) as e:
+        print(e)
         exit(1)
 
 def receiveFile(source, dest):
-    global sourcecount
-    global nReceivedFiles
-    fd = None
-    i = num = length = total = 0
-    destIsDir = 0
-    blocksize = 0x7000
-    startdir = bytearray(256)
-    namebase = bytearray(MAX_FILENAME_LEN)
-    basename = bytearray(MAX_FILENAME_LEN)
-    pos = bytearray(MAX_FILENAME_LEN)
-
-    #startdir[0:len(os.getcwd())] = bytearray(os.getcwd(), 'utf-8')
-    startdir = os.getcwd()
-
-    if os.path.isdir(dest):
-        os.chdir(dest)
-        destIsDir = 1
-
-    for i in range(min(len(source),MAX_FILENAME_LEN)):
-        receiveInit[i+3] = bytes(source[i],'utf-8')
-    receiveInit[i+4] = 0 if i < MAX_FILENAME_LEN else None
-    sendBlock(receiveInit, len(receiveInit))
-    receiveBlock(listbuf, LIST_BUFSIZE)
-
-    num = listbuf[0] | (listbuf[1] << 8)
-
-    if num == 0:
-        print(f"File not found on Portfolio: {source}")
-        exit(1)
-    """
-    namebase[0:len(source)] = bytearray(source,'utf-8')
-    pos = namebase.rfind(b':')
-    if pos > -1:
-        namebase = namebase[pos+1:]
-    pos = namebase.rfind(b'\\')
-    if pos > -1:
-        namebase = namebase[pos+1:]
-    """
-    pos = receiveInit.rfind(b':')
-    if pos > -1:
-        pos += 1
-    else:
-        pos = 3
-    pos = receiveInit[pos:].rfind(b'\\') + pos
-    if pos > -1:
-        pos += 1
-    else:
-        pos = 3
-
-    basename[0:len(listbuf)-2] = listbuf[2:]
-    basenames = [x for x in basename.split(b'\x00') if x != b'']
-
-    if num != len(basenames):
-        print("Something went wrong in my brain!")
+    try:
+        session.get(source, dest, force, mapped, writer, mirrorMode, journal)
+    except ERRORS + (OSError,) as e:
+        print(e)
         exit(1)
 
-    for i in range(1,num+1):
-        print(f"Transferring file {nReceivedFiles+1}", end='')
-        if sourcecount == 1:
-            print(f" of {num}", end='')
-        print(f": {str(basenames[i-1], 'utf-8')}")
-
-        if destIsDir:
-            dest = basenames[i-1]
-
-        if os.path.exists(dest):
-            if not force:
-                print("File exists! Use -f to force overwriting.")
-                if i < num:
-                    print("Remaining files are not copied!")
-                exit(1)
-                
-        try:
-            fd = open(dest, "wb")
-        except Exception as e:
-            print(f"{e}: Cannot create file: {dest.encode('utf-8')}")
-            if i<num:
-                print("Remaining files are not copied!")
-                exit(1)
-
-        receiveInit[0] = 2
-
-        for ci in range(pos,min(len(basenames[i-1]),len(receiveInit))):
-            receiveInit[pos+c] = basenames[i-1][ci]
-        sendBlock(receiveInit, len(receiveInit))
-        receiveBlock(controlData, CONTROL_BUFSIZE)
-
-        if controlData[0] != 0x20:
-            print("Unkown protocol error!")
-            exit(1)
-
-        total = controlData[7] | (controlData[8] << 8) | (controlData[9] << 16)
-
-        if total > blocksize:
-            nb = (total+blocksize-1)/blocksize
-            print(f"Transmission onsits of {nb} blocks of payload")
-
-        while total > 0:
-            length = receiveBlock(payload, PAYLOAD_BUFSIZE)
-            fd.write(payload)
-            total -= length
-
-        sendBlock(receiveFinish, len(receiveFinish))
-        fd.close()
-
-    if destIsdir:
-        os.chdir(startdir)
-
-    nReceivedFiles += num
-
-
 def listFiles(pattern):
-    i = num = 0
-    global names, name        
-    name = ""
-    global payload 
-    payload = bytearray(60000)
-    if (len(pattern) > 82-3):
-        print(f"Search Pattern too long! (maxlength : 79, pattern:{len(pattern)})")
+    try:
+        names = session.list(pattern)
+    except ERRORS as e:
+        print(e)
         exit(1)
-    print(f"Sending List files request for pattern {pattern}")
-    for i in range(len(pattern)):
-        receiveInit[i+3] = bytes(pattern[i],'utf-8')[0]
-    sendBlock(receiveInit,82)
-    receiveBlock(payload, 60000)
-
-    num = (payload[1] << 8) | payload[0]
-    if num == 0:
+    if not names:
         print("No Files found")
         return
-    names = list()
-    for i in range(60000-2):
-        name += chr(payload[i+2]) if payload[i+2] != 0 else ""
-        if payload[i+2] == 0:
-            names += [name] if name != '' else []
-            name = ""
     print(f"Found {len(names)} Files.")
     print("\n".join(names))
 
 def composePofoName(source, dest, pofoName, sourcecount):
-    pos = ext = 0
-    lastchar = ''
-
-    dest = dest.replace('/','\\')
-
-    pofoName = dest
-
-    lastChar = pofoName[-1]
-    if sourcecount > 1 or lastChar == '\\' or lastChar == ':':
-        length = 0
-
-        if lastChar != '\\':
-            pofoName += '\\'
-
-        pos = source.rfind('/')
-        if not pos > -1:
-            pos = source.rfind('\\')
-        if pos > -1:
-            pos += 1
-
-        ext = source.rfind('.')
-        if ext > -1:
-            source = source.replace('.','_')
-
-            length = ext - pos
-            if length > 8:
-                length = 8
-
-            if length > MAX_FILENAME_LEN-len(pofoName):
-                length = MAX_FILENAME_LEN-len(pofoName)
-                pofoName = source[pos:pos+length]
-                length = 4
-                if length > MAX_FILENAME_LEN-len(pofoName):
-                    length = MAX_FILENAME_LEN-len(pofoName)
-                pofoName = source[ext:ext+length]
-        else:
-            length = 8
-            if length > MAX_FILENAME_LEN-len(pofoName):
-                length = MAX_FILENAME_LEN-len(pofoName)
-            pofoName = source[ext:ext+length]
-
+    pofoName = pofosession.composePofoName(source, dest, sourcecount)
     print(f"after composePofo source:{source} dest:{dest} pofoName:{pofoName}") if verbose else None
     return pofoName
 
-
 if __name__ == '__main__':
     mode = ''
     dest = None
     #listFiles('c:\\*.*')
     print("pytrans.py 0.01 - (c) 2022 by Carsten Busse")
     for i in range(1,len(sys.argv)):
+        if sys.argv[i] == '--stats':
+            stats = linkstats.linkstats()
+            continue
+        if sys.argv[i] == '--changed-only':
+            manifest = True
+            continue
+        if sys.argv[i].startswith('--id='):
+            deviceId = sys.argv[i][5:]
+            continue
+        if sys.argv[i] == '--mirror':
+            mirrorMode = True
+            continue
+        if sys.argv[i] == '--resume':
+            resume = True
+            continue
+        if sys.argv[i] in ('--progress', '--progress=tty', '--progress=json'):
+            progressMode = sys.argv[i][11:] or 'tty'
+            continue
+        if sys.argv[i].startswith('--progress=json:'):
+            progressMode, progressPath = 'json', sys.argv[i][16:]
+            continue
+        if sys.argv[i] == '--mmap':
+            mapped = True
+            continue
+        if sys.argv[i] == '--shadow':
+            shadow = True
+            continue
+        if sys.argv[i].startswith('--timeout='):
+            timeout = float(sys.argv[i][10:]) or None
+            continue
+        if sys.argv[i].startswith('--polls='):
+            polls = int(sys.argv[i][8:])
+            continue
+        if sys.argv[i].startswith('--retries='):
+            retries = int(sys.argv[i][10:])
+            continue
         if sys.argv[i][0] == '-' or sys.argv[i][0] == '/':
             optLen = len(sys.argv[i])
             if optLen < 2 or optLen > 3:
@@ -481,6 +192,9 @@ if __name__ == '__main__':
                 elif letter == 'f':
                     force = 1
                     break
+                elif letter == 'b':
+                    batch = BATCH_BYTES
+                    break
                 elif letter == 'd':
                     device = None
                     break
@@ -499,6 +213,7 @@ if __name__ == '__main__':
         else:
             if device is None:
                 device = sys.argv[i]
+                continue
             elif not sourcelist:
                 print("Creating sourcelist")
                 sourcelist = list()
@@ -518,13 +233,29 @@ if __name__ == '__main__':
     if mode == 'h' or (mode == 't' and dest is None) or (mode == 'r' and dest is None) or (mode == 'l' and sourcelist is None):
            print(f"""
 Syntax: {sys.argv[0]}
-    [-d DEVICE]  for example \\.\LPT1  [autodetect]
+    [-d DEVICE]  for example \\.\LPT1 or sim:DIR  [autodetect]
     [-f]         Force overwrite [off]
+    [-b]         Batch {BATCH_BYTES} bytes per ioctl [off]
+    [--polls=N]  Status reads per handshake step of -b [{polls}]
+    [-D]         Trace the link, dumped when a transfer fails [off]
+    [--stats]    Print link statistics at the end [off]
+    [--timeout=SECONDS]  Give up on a silent Portfolio [10]
+    [--retries=N]  Repeat a file after link errors [{pofosession.RETRIES}]
+    [--shadow]   Skip port writes that change nothing [off]
+    [--mmap]     Write received files through a memory map [off]
+    [--mirror]   -r skips files whose local copy is unchanged since the last pull,
+                 changes on the Portfolio are not detected [off]
+    [--changed-only]  -t skips files unchanged since the last push [off]
+    [--id=NAME]  Name of the Portfolio in the push manifest [DEVICE]
+    [--resume]   Continue an interrupted -t or -r batch [off]
+    [--progress[=tty|json[:PATH]]]  Report the progress of the transfer [off]
     [-t|-r]      SOURCE DEST
 or      {sys.argv[0]}
     [-l PATTERN]
 
     -d  Device to usb2lpt Parallel Port Device, Default value is "autodetect"
+        "sim" or "sim:DIR" runs against a simulated Portfolio instead,
+        its drive C: is filled with the files of DIR.
     -t  Transmit files(s) to Portfolio.
         Wildcards are not directly supported but may be expanded
         by the shell to generate a list of source files.
@@ -533,6 +264,50 @@ or      {sys.argv[0]}
         In a Unix like shell, quoting is required.
     -l  List directory files on Portfolio matchin PATTERN
     -f  Force overwriting an existing file.
+    -b  Batch the port accesses of many bytes into a single ioctl,
+        every handshake is verified after the program ran.
+    --polls=N  Every handshake step of a -b program reads the status N
+        times, a Portfolio whose acknowledge shows up in none of them
+        is too slow for the batch: raise N, the link is synchronized
+        again and the block repeated.
+    -D  Keep the last {linktrace.TRACE_RECORDS} link events (port accesses, clock waits,
+        bits, bytes and blocks) in memory, print them when a transfer
+        fails and trace the probing of the autodetect.
+    --stats  Count port accesses, clock polls, ioctl latencies and
+        the throughput of every block and print a summary at the end.
+    --timeout=SECONDS  Abort when the Portfolio does not answer within
+        SECONDS during a transfer, 0 waits forever.
+    --retries=N  After a checksum error, a garbled acknowledge or a
+        timeout the link is synchronized again and the listing or file
+        is repeated, at most N times.  Files already received or sent
+        are not repeated.  --stats counts the retries.
+    --shadow  Remember the last data and control port values and drop
+        writes that would not change the pins.
+    --mmap  Received files are preallocated to their announced size
+        in any case, --mmap copies the blocks into a memory map of the
+        file instead of writing them.
+    --mirror  DEST of -r is a mirror directory.  Files pulled before
+        whose local copy is untouched since are skipped, new files and
+        changed local copies are fetched again.  The Portfolio cannot
+        tell a file's size without sending it, so a file changed on the
+        Portfolio under the same name is not detected: it is only
+        fetched again after its local copy was deleted.
+    --changed-only  -t remembers size and SHA-256 of every file pushed
+        in ~/.pytrans-push.json, per Portfolio and Portfolio path, and
+        skips files whose content was pushed there before.  --id names
+        the Portfolio, without it the adapter device is used.
+    --resume  Every -t and -r batch records its listings and completed
+        files in a journal of its own, ~/.pytrans-journal-HASH.jsonl
+        named after device, sources and DEST.  After an interrupted batch,
+        the same command with --resume skips the files completed before,
+        as long as their local copy is unchanged, and goes on with the
+        first unfinished one.  A batch runs without a journal where none
+        can be written, journals untouched for 30 days are removed.
+    --progress  Show file, bytes, blocks, throughput and ETA of the
+        transfer in a status line on stderr, a few times per second.
+        --progress=json writes the same as JSON lines to stderr, apart
+        from the messages on stdout, --progress=json:PATH to file PATH.
+        -V turns on the status line as well.
 
 Notes:
    SOURCE may be a single file or a list of files.
@@ -543,30 +318,104 @@ Notes:
    https://www-user.tu-chemnitz.de/~heha/basteln/PC/USB2LPT/
    this adapter will be accessed through windows ioctl's.""")
            exit(1)
-    if type(device) is str:
-        myport = usb2lpt.usb2lpt(device)
-    else:
-        myport = usb2lpt.usb2lpt()
-    print("Waiting for Portfolio...")
-    myport.outData(2)
-    waitClockHigh()
-    byte = receiveByte()
-    while byte != 0x50:
-        waitClockLow()
-        myport.outData(0)
-        waitClockHigh()
-        myport.outData(2)
-        byte = receiveByte()
-    
-    for i in range(sourcecount):
-        if mode == 't':
-            pofoName = ''
-            pofoName = composePofoName(sourcelist[i], dest, pofoName, sourcecount)
-            print(f"Transmitting file {i+1} of {sourcecount}: {sourcelist[i]} -> {pofoName}")
-            transmitFile(sourcelist[i], pofoName)
-        elif mode == 'r':
-            receiveFile(sourcelist[i], dest)
-        elif mode == 'l':
-            listFiles(sourcelist[i])
+    trace = linktrace.linkTrace() if debug else None
+    # the probing of the autodetect goes into the same trace
+    usb2lpt.usb2lpt.trace = trace
+    try:
+        myport = pofosession.openPort(device)
+    except lptport.lptportException as e:
+        print(e)
+        if trace:
+            trace.dump()
+        exit(1)
+    session = pofosession.PortfolioSession(myport, batch, polls, timeout, stats, shadow, retries=retries,
+                                           trace=trace)
+    session.verbose, session.slomo = verbose, slomo
+    # the counters matter most when a transfer failed
+    try:
+        if progressMode is None and verbose > 1:
+            progressMode = 'tty'
+        try:
+            session.synchronize()
+        except ERRORS as e:
+            print(e)
+            exit(1)
 
-    print("TASKS Finished.")
+        if mode in ('t', 'r'):
+            # local paths absolute, a resumed batch may run from elsewhere
+            if mode == 't':
+                batchSources, batchDest = [os.path.abspath(src) for src in sourcelist[:sourcecount]], dest
+            else:
+                batchSources, batchDest = sourcelist[:sourcecount], os.path.abspath(dest)
+            try:
+                journal = mirror.batchJournal({'mode': mode, 'device': deviceId or myport.dev,
+                                               'sources': batchSources, 'dest': batchDest}, resume)
+            except mirror.mirrorException as e:
+                print(e)
+                exit(1)
+            except OSError as e:
+                # the journal only serves --resume, the transfer goes on without
+                print(f"{e}: no journal, the batch cannot be resumed")
+                journal = None
+
+        if progressMode and mode in ('t', 'r'):
+            if progressMode == 'tty':
+                sink = progress.ttySink()
+            elif progressPath:
+                try:
+                    sink = progress.jsonSink(open(progressPath, 'w'))
+                except OSError as e:
+                    print(e)
+                    exit(1)
+            else:
+                sink = progress.jsonSink(sys.stderr)
+            reporter = progress.progressReporter(session.progress, [sink])
+
+        # the disk work of a batch runs in threads of its own
+        if mode == 't' and manifest:
+            try:
+                manifest = mirror.pushManifest(deviceId or myport.dev)
+            except mirror.mirrorException as e:
+                print(e)
+                exit(1)
+            manifest.prepare(sourcelist[:sourcecount])
+        else:
+            manifest = None
+        if mode == 't' and sourcecount > 1:
+            prefetch = fileio.prefetcher(sourcelist[:sourcecount])
+        elif mode == 'r':
+            writer = fileio.writeBehind()
+
+        for i in range(sourcecount):
+            if mode == 't':
+                pofoName = ''
+                pofoName = composePofoName(sourcelist[i], dest, pofoName, sourcecount)
+                print(f"Transmitting file {i+1} of {sourcecount}: {sourcelist[i]} -> {pofoName}")
+                session.progress.startFile(pofoName, i, sourcecount)
+                transmitFile(sourcelist[i], pofoName)
+            elif mode == 'r':
+                receiveFile(sourcelist[i], dest)
+            elif mode == 'l':
+                listFiles(sourcelist[i])
+        if reporter:
+            reporter.close()
+            if progressPath:
+                sink.stream.close()
+        if manifest:
+            manifest.close()
+            print(f"Skipped {manifest.skipped} unchanged files, {manifest.saved} bytes saved.")
+        if writer:
+            try:
+                writer.close()
+            except OSError as e:
+                print(f"{e}: Cannot write received files")
+                exit(1)
+        if journal:
+            if journal.skipped:
+                print(f"Resumed after {journal.skipped} files completed before, {journal.saved} bytes saved.")
+            journal.finish()
+
+        print("TASKS Finished.")
+    finally:
+        if stats:
+            print(stats.summary())
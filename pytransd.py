@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Transfer daemon for pytrans.
+
+The daemon opens the device once, keeps one PortfolioSession synchronized
+and runs list, get and put jobs it receives over a local socket one after
+the other, so a job costs only its transfer time.  The same script is the
+client: every job is one connection carrying one JSON line, the daemon
+answers with JSON lines {"log": message} while the job runs and a final
+{"ok": result} or {"error": message}.
+
+    python pytransd.py serve [-d DEVICE] [-b] [--polls=N]
+    python pytransd.py list PATTERN
+    python pytransd.py get [-f] [--mirror] PATTERN DEST
+    python pytransd.py put [-f] SOURCE... DEST
+    python pytransd.py stop
+
+The socket is a Unix domain socket in the home directory, where the
+platform has none (CPython on Windows, the platform of usb2lpt)
+127.0.0.1:PORT is used instead, which any local process can connect to.
+So every job carries a secret the daemon writes to a file only its user
+may read, ~/.pytransd.token, anew whenever it starts; a job without it
+is refused.  A daemon refuses to start while another one answers on the
+socket.  Local paths are sent as absolute paths, the daemon resolves them
+itself.
+"""
+import hmac
+import json
+import os
+import queue
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+import pofosession
+
+SOCKET_PATH = os.path.join(os.path.expanduser('~'), '.pytransd.sock')
+TOKEN_PATH = os.path.join(os.path.expanduser('~'), '.pytransd.token')
+PORT = 50917
+
+class pytransdException(Exception):
+    pass
+
+jobs = queue.Queue()    # (job, replies) in arrival order
+
+token = None    # the secret of this daemon, every job has to carry it
+
+# fields of every job and their types, flags may be left out
+FIELDS = {
+    'list': {'pattern': str},
+    'get': {'pattern': str, 'dest': str},
+    'put': {'sources': list, 'dest': str},
+    'stop': {},
+    }
+FLAGS = ('force', 'mirror')
+
+def checkJob(job):
+    """raises pytransdException unless job is one runJob can run"""
+    fields = FIELDS.get(job.get('op'))
+    if fields is None:
+        raise pytransdException(f"Unknown job {job.get('op')!r}")
+    for name, kind in fields.items():
+        if type(job.get(name)) is not kind:
+            raise pytransdException(f"Bad job: {name} has to be a {kind.__name__}")
+    for name in FLAGS:
+        if type(job.get(name, False)) is not bool:
+            raise pytransdException(f"Bad job: {name} has to be true or false")
+    if 'sources' in fields and (not job['sources'] or any(type(src) is not str for src in job['sources'])):
+        raise pytransdException("Bad job: sources has to be a list of paths")
+
+def worker(session):
+    # the only thread touching the port, jobs run back to back
+    while True:
+        job, replies = jobs.get()
+        session.log = lambda msg: replies.put({'log': msg})
+        try:
+            replies.put({'ok': session.runJob(job)})
+        except pofosession.ERRORS + (OSError, KeyError) as e:
+            replies.put({'error': str(e) or repr(e)})
+        except Exception as e:
+            # whatever a job does, the worker has to stay for the next one
+            replies.put({'error': f"Job failed: {e!r}"})
+        finally:
+            session.log = print
+
+class jobHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # a serve checking for a running daemon
+            return
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            self.reply({'error': f"Bad job: {e}"})
+            return
+        if type(job) is not dict or not hmac.compare_digest(str(job.pop('token', '')), token):
+            self.reply({'error': f"Job refused, it lacks the secret of {TOKEN_PATH}"})
+            return
+        try:
+            checkJob(job)
+        except pytransdException as e:
+            self.reply({'error': str(e)})
+            return
+        if job.get('op') == 'stop':
+            self.reply({'ok': 'stopping'})
+            threading.Thread(target=self.server.shutdown).start()
+            return
+        replies = queue.Queue()
+        jobs.put((job, replies))
+        while True:
+            reply = replies.get()
+            try:
+                self.reply(reply)
+            except OSError:
+                # the client went away, the job still runs to its end
+                pass
+            if 'log' not in reply:
+                return
+
+    def reply(self, reply):
+        self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+def connect():
+    """a socket connected to the daemon, raises OSError if none answers"""
+    if hasattr(socket, 'AF_UNIX'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address = SOCKET_PATH
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = ('127.0.0.1', PORT)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+def writeToken():
+    global token
+    token = secrets.token_hex(16)
+    if os.path.exists(TOKEN_PATH):
+        os.remove(TOKEN_PATH)
+    # created readable for the user only, not chmod'ed afterwards
+    fd = os.open(TOKEN_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with open(fd, 'w') as f:
+        f.write(token)
+
+def serve(device, batch, polls=8):
+    try:
+        connect().close()
+    except OSError:
+        pass
+    else:
+        raise pytransdException("A daemon is serving jobs already, stop it first (pytransd.py stop)")
+    session = pofosession.PortfolioSession(pofosession.openPort(device), batch, polls)
+    session.synchronize()
+    writeToken()
+    threading.Thread(target=worker, args=(session,), daemon=True).start()
+    if hasattr(socket, 'AF_UNIX'):
+        if os.path.exists(SOCKET_PATH):
+            # nobody answered on it, left over by a daemon that died
+            os.remove(SOCKET_PATH)
+        server = socketserver.ThreadingUnixStreamServer(SOCKET_PATH, jobHandler)
+        os.chmod(SOCKET_PATH, 0o600)
+        print(f"Serving jobs on {SOCKET_PATH}")
+    else:
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', PORT), jobHandler)
+        print(f"Serving jobs on 127.0.0.1:{PORT}")
+    server.daemon_threads = True
+    with server:
+        server.serve_forever()
+    if hasattr(socket, 'AF_UNIX'):
+        os.remove(SOCKET_PATH)
+
+def submit(job):
+    """send a job to the daemon, print its messages, returns the final reply"""
+    try:
+        with open(TOKEN_PATH) as fd:
+            secret = fd.read().strip()
+        sock = connect()
+    except OSError as e:
+        raise pytransdException(f"{e}: is the daemon running? (pytransd.py serve)")
+    with sock:
+        sock.sendall(json.dumps(dict(job, token=secret)).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as fd:
+            for line in fd:
+                reply = json.loads(line)
+                if 'log' in reply:
+                    print(reply['log'])
+                else:
+                    return reply
+    raise pytransdException("Daemon closed the connection")
+
+def usage():
+    print(__doc__)
+    exit(1)
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if not args:
+        usage()
+    command = args.pop(0)
+    force = '-f' in args
+    mirrored = '--mirror' in args
+    args = [arg for arg in args if arg not in ('-f', '--mirror')]
+    if command == 'serve':
+        device = 'autodetect'
+        batch = 0
+        polls = 8
+        while args:
+            arg = args.pop(0)
+            if arg == '-d' and args:
+                device = args.pop(0)
+            elif arg == '-b':
+                batch = pofosession.BATCH_BYTES
+            elif arg.startswith('--polls='):
+                polls = int(arg[8:])
+            else:
+                usage()
+        try:
+            serve(device, batch, polls)
+        except pofosession.ERRORS + (pytransdException, OSError) as e:
+            print(e)
+            exit(1)
+        exit(0)
+    if command == 'list' and len(args) == 1:
+        job = {'op': 'list', 'pattern': args[0]}
+    elif command == 'get' and len(args) == 2:
+        job = {'op': 'get', 'pattern': args[0], 'dest': os.path.abspath(args[1]), 'force': force, 'mirror': mirrored}
+    elif command == 'put' and len(args) >= 2:
+        job = {'op': 'put', 'sources': [os.path.abspath(arg) for arg in args[:-1]], 'dest': args[-1], 'force': force}
+    elif command == 'stop' and not args:
+        job = {'op': 'stop'}
+    else:
+        usage()
+    try:
+        reply = submit(job)
+    except pytransdException as e:
+        print(e)
+        exit(1)
+    if 'error' in reply:
+        print(reply['error'])
+        exit(1)
+    if command == 'list':
+        print("\n".join(reply['ok']) if reply['ok'] else "No Files found")
@@ -0,0 +1,215 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Runs transfer jobs on several Portfolios at once.
+
+Every adapter gets a PortfolioSession and a worker thread of its own.  The
+workers take jobs from a shared queue, so a batch spreads over all
+Portfolios, or from the queue of their own device for jobs pinned to it
+(broadcast pins a copy of a job to every device, e.g. to provision all
+Portfolios with the same files).  Progress lines carry the device name,
+report() sums up jobs, bytes and throughput per device and in total.
+
+A worker synchronizes its Portfolio, within the timeout of the session,
+before it takes the first job and again after a job lost the sync; a
+Portfolio that does not answer fails its device and leaves the jobs to
+the others.  The result of every job is logged and kept in results.
+
+    python scheduler.py [-b] [--polls=N] [--each] [-d DEVICE]... JOBFILE
+
+JOBFILE holds one job per line as JSON, in the format of pytransd:
+{"op": "put", "sources": ["a.txt"], "dest": "C:\\", "force": true}.
+--each runs every job on every Portfolio instead of spreading them.
+Without -d every usb2lpt adapter found is used.
+"""
+import json
+import queue
+import sys
+import threading
+import time
+import linkstats
+import pofosession
+import usb2lpt
+
+class schedulerException(Exception):
+    pass
+
+class deviceWorker:
+
+    def __init__(self, name, session):
+        self.name = name
+        self.session = session
+        self.jobs = queue.Queue()   # jobs pinned to this device
+        self.done = 0
+        self.results = []   # (job, result) of the jobs run
+        self.errors = []
+        self.failed = False
+        self.seconds = 0.0
+        self.thread = None
+
+class transferScheduler:
+
+    def __init__(self, ports, batch=0, log=print, polls=8):
+        self.log = log
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue()   # jobs for any device
+        self.workers = []
+        self.seconds = 0.0
+        for i, port in enumerate(ports):
+            name = f"{port.dev}" if len(set(p.dev for p in ports)) == len(ports) else f"{i}:{port.dev}"
+            session = pofosession.PortfolioSession(port, batch, polls, stats=linkstats.linkstats(),
+                                                   log=self._logger(name))
+            self.workers.append(deviceWorker(name, session))
+        if not self.workers:
+            raise schedulerException("No device to schedule jobs on")
+
+    def _logger(self, name):
+        def log(msg):
+            with self.lock:
+                self.log(f"[{name}] {msg}")
+        return log
+
+    def submit(self, job):
+        """job for whichever device is free first"""
+        self.jobs.put(job)
+
+    def broadcast(self, job):
+        """job for every device"""
+        for worker in self.workers:
+            worker.jobs.put(job)
+
+    def _next(self, worker):
+        for jobs in (worker.jobs, self.jobs):
+            try:
+                return jobs.get_nowait()
+            except queue.Empty:
+                pass
+        return None
+
+    def _sync(self, worker):
+        # a job is only taken with the Portfolio answering
+        session = worker.session
+        try:
+            if session.lost:
+                session.resynchronize()
+            else:
+                session.synchronize(session.timeout)
+        except pofosession.ERRORS as e:
+            session.log(f"No answer from the Portfolio, leaving the jobs to the others: {e}")
+            worker.failed = True
+
+    def _work(self, worker):
+        session = worker.session
+        start = time.perf_counter()
+        self._sync(worker)
+        while not worker.failed:
+            job = self._next(worker)
+            if job is None:
+                break
+            try:
+                result = session.runJob(job)
+                worker.done += 1
+                worker.results.append((job, result))
+                session.log(f"Job {job.get('op')} done: {' '.join(result) if result else 'no files'}")
+            except pofosession.ERRORS + (OSError, KeyError) as e:
+                session.log(f"Job {job.get('op')} failed: {e}")
+                worker.errors.append((job, str(e)))
+            if not session.synced:
+                self._sync(worker)
+        worker.seconds = time.perf_counter() - start
+
+    def run(self):
+        """run all queued jobs, returns when every device is done"""
+        start = time.perf_counter()
+        for worker in self.workers:
+            worker.thread = threading.Thread(target=self._work, args=(worker,), daemon=True)
+            worker.thread.start()
+        for worker in self.workers:
+            worker.thread.join()
+        self.seconds = time.perf_counter() - start
+        # jobs left when devices failed
+        left = self.jobs.qsize() + sum(w.jobs.qsize() for w in self.workers)
+        return left
+
+    def report(self):
+        lines = []
+        total = 0
+        for worker in self.workers:
+            stats = worker.session.stats
+            nbytes = stats.totals('send')['bytes'] + stats.totals('receive')['bytes']
+            total += nbytes
+            rate = nbytes / worker.seconds if worker.seconds else 0.0
+            state = " FAILED" if worker.failed else ""
+            lines.append(f"{worker.name:12s} {worker.done:5d} jobs {len(worker.errors):3d} errors "
+                         f"{nbytes:10d} bytes {worker.seconds:9.3f}s {rate:10.1f} B/s{state}")
+        rate = total / self.seconds if self.seconds else 0.0
+        lines.append(f"{'total':12s} {sum(w.done for w in self.workers):5d} jobs "
+                     f"{sum(len(w.errors) for w in self.workers):3d} errors "
+                     f"{total:10d} bytes {self.seconds:9.3f}s {rate:10.1f} B/s")
+        return "\n".join(lines)
+
+if __name__ == '__main__':
+    batch = 0
+    polls = 8
+    each = False
+    devices = []
+    jobfile = None
+    args = sys.argv[1:]
+    while args:
+        arg = args.pop(0)
+        if arg == '-b':
+            batch = pofosession.BATCH_BYTES
+        elif arg.startswith('--polls='):
+            polls = int(arg[8:])
+        elif arg == '--each':
+            each = True
+        elif arg == '-d' and args:
+            devices.append(args.pop(0))
+        elif jobfile is None and not arg.startswith('-'):
+            jobfile = arg
+        else:
+            jobfile = None
+            break
+    if jobfile is None:
+        print(__doc__)
+        exit(1)
+    with open(jobfile) as fd:
+        jobs = [json.loads(line) for line in fd if line.strip()]
+    try:
+        ports = [pofosession.openPort(dev) for dev in devices] if devices else usb2lpt.usb2lpt.detectAll()
+        scheduler = transferScheduler(ports, batch, polls=polls)
+    except pofosession.ERRORS + (schedulerException,) as e:
+        print(e)
+        exit(1)
+    for job in jobs:
+        scheduler.broadcast(job) if each else scheduler.submit(job)
+    left = scheduler.run()
+    print(scheduler.report())
+    if left or any(w.errors for w in scheduler.workers):
+        print(f"{left} jobs not run") if left else None
+        exit(1)
@@ -0,0 +1,278 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Simulated Atari Portfolio for pytrans.
+
+simpofo is a lptport backend that runs the server side of the Portfolio
+transfer protocol in-process: the 0x50 sync, the 'Z'/0xA5 block framing and
+the list (0x06), receive (0x02) and transmit (0x03) control blocks.
+Files live in a dict keyed by the upper case Portfolio path, e.g. C:\\FOO.TXT.
+
+The Portfolio side is a generator that yields what it is waiting for:
+a (mask, value) tuple waits until the host's data port matches, None waits
+until the host sampled the status port once.  Every port access of the host
+advances it, so a whole transfer runs deterministically without hardware.
+latency is the number of status polls the Portfolio needs to react.
+
+Like the Portfolio, the simulation gives up a transfer on a checksum that
+does not match or a byte it did not expect and announces itself with 0x50
+again, so the host has to synchronize anew.  noise is the probability that
+a byte it sends has a bit flipped on the way, to exercise the recovery of
+the host; seed makes those flips reproducible.  garbled is the exact
+counterpart: a list of Portfolio paths, a receive of a file listed there
+gets its first block with a wrong checksum, once per entry.
+"""
+import fnmatch
+import os
+import random
+import lptport
+
+verbose = 0
+
+BLOCKSIZE = 0x7000
+
+class simpofoException(lptport.lptportException):
+    pass
+
+class simpofo(lptport.lptport):
+
+    def __init__(self, files=None, latency=0, noise=0.0, seed=0, garbled=None):
+        self.dev = 'sim'
+        self.firmware = 'simulated'
+        self.files = {}
+        if type(files) is str:
+            # every file of a local directory shows up on drive C:
+            for name in sorted(os.listdir(files)):
+                path = os.path.join(files, name)
+                if os.path.isfile(path):
+                    with open(path, 'rb') as fd:
+                        self.files['C:\\' + name.upper()] = fd.read()
+        elif files:
+            for name, data in files.items():
+                self.files[name.upper()] = bytes(data)
+        self.latency = latency
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.garbled = list(garbled or [])
+        self.data = 0
+        self.control = 0
+        self.status = 0x20
+        self.delay = 0
+        self.latched = None
+        self.server = self._serve()
+        self.wait = next(self.server)
+
+    def _tick(self, read):
+        # run the Portfolio after a host access until it has to wait again,
+        # a met data port condition is latched until the latency has passed
+        while True:
+            if self.wait is None:
+                if not read:
+                    return
+                read = False
+            else:
+                if self.latched is None:
+                    if (self.data & self.wait[0]) != self.wait[1]:
+                        return
+                    self.latched = self.data
+                if self.delay:
+                    if not read:
+                        return
+                    read = False
+                    self.delay -= 1
+                    if self.delay:
+                        return
+            self.wait = self.server.send(self.latched)
+            self.latched = None
+            self.delay = self.latency
+
+    def inData(self):
+        return self.data
+
+    def inStatus(self):
+        status = self.status
+        self._tick(True)
+        return status
+
+    def inControl(self):
+        return self.control
+
+    def outData(self, data):
+        self.data = data
+        self._tick(False)
+
+    def outControl(self, data):
+        self.control = data
+
+    # Portfolio side of the protocol
+
+    def _sendByte(self, byte):
+        if self.noise and self.random.random() < self.noise:
+            byte ^= 1 << self.random.randrange(8)
+        for i in range(4):
+            self.status = (byte & 0x80) >> 3
+            yield (2, 0)
+            byte = byte << 1
+            self.status = ((byte & 0x80) >> 3) | 0x20
+            yield (2, 2)
+            byte = byte << 1
+
+    def _receiveByte(self):
+        byte = 0
+        for i in range(4):
+            data = yield (2, 0)
+            byte = (byte << 1) | (data & 1)
+            self.status = 0
+            data = yield (2, 2)
+            byte = (byte << 1) | (data & 1)
+            self.status = 0x20
+        # the host has to see the last acknowledge before we may answer
+        yield None
+        return byte
+
+    def _receiveBlock(self):
+        # counterpart of pytrans.sendBlock
+        yield from self._sendByte(ord('Z'))
+        byte = yield from self._receiveByte()
+        if byte != 0xa5:
+            raise simpofoException(f"Expected 0xA5, got {byte:02x}")
+        lenL = yield from self._receiveByte()
+        lenH = yield from self._receiveByte()
+        length = (lenH << 8) | lenL
+        block = bytearray(length)
+        for i in range(length):
+            block[i] = yield from self._receiveByte()
+        checksum = yield from self._receiveByte()
+        if (lenL + lenH + sum(block) + checksum) & 0xff:
+            yield from self._sendByte(~checksum & 0xff)
+            raise simpofoException("Checksum error in a received block")
+        yield from self._sendByte(checksum)
+        return block
+
+    def _sendBlock(self, block, garble=False):
+        # counterpart of pytrans.receiveBlock
+        byte = yield from self._receiveByte()
+        if byte != ord('Z'):
+            raise simpofoException(f"Expected 'Z', got {byte:02x}")
+        length = len(block)
+        yield from self._sendByte(0xa5)
+        yield from self._sendByte(length & 0xff)
+        yield from self._sendByte(length >> 8)
+        for byte in block:
+            yield from self._sendByte(byte)
+        checksum = -((length & 0xff) + (length >> 8) + sum(block)) & 0xff
+        yield from self._sendByte(checksum ^ 0xff if garble else checksum)
+        echo = yield from self._receiveByte()
+        if echo != checksum:
+            raise simpofoException(f"Host echoed {echo:02x} instead of {checksum:02x}")
+
+    def _serve(self):
+        while True:
+            # wait for the host to raise its clock, then announce ourselves
+            self.status = 0x20
+            yield (2, 2)
+            yield None
+            yield from self._sendByte(0x50)
+            try:
+                yield from self._server()
+            except simpofoException as e:
+                # the transfer is lost, wait for the host to synchronize
+                print(f"simpofo: {e}") if verbose else None
+
+    def _server(self):
+        while True:
+            block = yield from self._receiveBlock()
+            if not block:
+                continue
+            name = bytes(block[3:]).split(b'\x00')[0].decode('latin-1').upper()
+            if block[0] == 0x06:
+                yield from self._list(name)
+            elif block[0] == 0x02:
+                yield from self._transmit(name)
+            elif block[0] == 0x03:
+                length = block[7] | (block[8] << 8) | (block[9] << 16) | (block[10] << 24)
+                name = bytes(block[11:]).split(b'\x00')[0].decode('latin-1').upper()
+                yield from self._receive(name, length)
+            else:
+                print(f"simpofo: unknown control block {block[0]:02x}") if verbose else None
+
+    def matchFiles(self, pattern):
+        pos = max(pattern.rfind('\\'), pattern.rfind(':'))
+        directory, pattern = pattern[:pos+1], pattern[pos+1:]
+        names = []
+        for path in self.files:
+            pos = path.rfind('\\')
+            if path[:pos+1] != directory:
+                continue
+            name = path[pos+1:]
+            # DOS semantics, *.* also matches names without extension
+            if fnmatch.fnmatchcase(name, pattern) or ('.' not in name and fnmatch.fnmatchcase(name + '.', pattern)):
+                names.append(name)
+        return names
+
+    def _list(self, pattern):
+        names = self.matchFiles(pattern)
+        reply = bytearray([len(names) & 0xff, len(names) >> 8])
+        for name in names:
+            reply += name.encode('latin-1') + b'\x00'
+        yield from self._sendBlock(reply)
+
+    def _transmit(self, name):
+        # Portfolio -> host
+        if name not in self.files:
+            yield from self._sendBlock(bytes([0x10]))
+            return
+        data = self.files[name]
+        length = len(data)
+        yield from self._sendBlock(bytes([0x20, BLOCKSIZE & 0xff, BLOCKSIZE >> 8, 0, 0, 0, 0,
+                                          length & 0xff, (length >> 8) & 0xff,
+                                          (length >> 16) & 0xff, (length >> 24) & 0xff]))
+        garble = name in self.garbled
+        if garble:
+            self.garbled.remove(name)
+        for pos in range(0, length, BLOCKSIZE):
+            yield from self._sendBlock(data[pos:pos+BLOCKSIZE], garble and not pos)
+        yield from self._receiveBlock()   # receiveFinish
+
+    def _receive(self, name, length):
+        # host -> Portfolio
+        if not name or ':' not in name:
+            yield from self._sendBlock(bytes([0x10]))
+            return
+        if name in self.files:
+            yield from self._sendBlock(bytes([0x20, BLOCKSIZE & 0xff, BLOCKSIZE >> 8]))
+            answer = yield from self._receiveBlock()
+            if answer[0] != 0x05:
+                return
+        else:
+            yield from self._sendBlock(bytes([0x00, BLOCKSIZE & 0xff, BLOCKSIZE >> 8]))
+        data = bytearray()
+        while len(data) < length:
+            data += yield from self._receiveBlock()
+        self.files[name] = bytes(data)
+        yield from self._sendBlock(bytes([0x20]))
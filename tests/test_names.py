@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Portfolio names composed for transmitted files: 8.3 names with a single
+dot, checked directly and on what arrives at the simulated Portfolio.
+
+    python -m unittest discover tests
+"""
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pofosession
+import simpofo
+
+# what DOS accepts as the last component of a path
+NAME_8_3 = re.compile(r'[^.\\]{1,8}(\.[^.\\]{1,3})?$')
+
+class composePofoNameTest(unittest.TestCase):
+
+    def testNames(self):
+        cases = [
+            ('notes.txt', 'C:\\', 1, 'C:\\notes.txt'),
+            ('up/file1.longname.txt', 'C:\\', 1, 'C:\\file1_lo.txt'),
+            ('up\\a.b.c', 'C:\\DIR\\', 1, 'C:\\DIR\\a_b.c'),
+            ('verylongname.c', 'C:', 1, 'C:\\verylong.c'),
+            ('dir.d/noext', 'C:\\', 1, 'C:\\noext'),
+            ('report.html', 'C:\\DOCS', 2, 'C:\\DOCS\\report.htm'),
+            ('notes.txt', 'C:\\NEW.TXT', 1, 'C:\\NEW.TXT'),
+            ('notes.txt', 'c:/sub/', 1, 'c:\\sub\\notes.txt'),
+            ]
+        for source, dest, count, name in cases:
+            with self.subTest(source=source, dest=dest):
+                self.assertEqual(pofosession.composePofoName(source, dest, count), name)
+
+    def testTransmitted(self):
+        port = simpofo.simpofo()
+        session = pofosession.PortfolioSession(port, timeout=2.0, log=lambda msg: None)
+        session.synchronize()
+        with tempfile.TemporaryDirectory() as tmp:
+            sources = []
+            for name in ('file1.longname.txt', 'archive.tar.gz', 'README', 'x.y.z.w'):
+                path = os.path.join(tmp, name)
+                with open(path, 'wb') as fd:
+                    fd.write(name.encode())
+                sources.append(path)
+            sent = session.runJob({'op': 'put', 'sources': sources, 'dest': 'C:\\'})
+        self.assertEqual(sorted(port.files), sorted(name.upper() for name in sent))
+        for name in sent:
+            self.assertRegex(name[3:], NAME_8_3)
+
+if __name__ == '__main__':
+    unittest.main()
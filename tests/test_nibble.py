@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+The pure Python fallback of nibble against its NumPy code path, on
+random blocks and on whole batched and unbatched transfers with the
+simulated Portfolio.
+
+    python -m unittest discover tests
+"""
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import nibble
+import pofosession
+import simpofo
+
+POLLS = 4
+
+@contextlib.contextmanager
+def purePython():
+    # the tables built with NumPy do not work without it
+    saved = nibble.numpy, dict(nibble._sendPrograms)
+    nibble.numpy = None
+    nibble._sendPrograms.clear()
+    try:
+        yield
+    finally:
+        nibble.numpy = saved[0]
+        nibble._sendPrograms.clear()
+        nibble._sendPrograms.update(saved[1])
+
+def samples(data, polls, rng):
+    """status reads of a batched receive of data, the acknowledge in a random poll"""
+    out = bytearray()
+    for byte in data:
+        for i in range(8):
+            bit = ((byte >> (7-i)) & 1) << 4
+            clock = nibble.CLOCK_PATTERN[i]
+            ack = rng.randrange(polls)
+            out += bytes((clock ^ 0x20) | rng.getrandbits(1) << 4 for j in range(ack))
+            out += bytes(clock | bit for j in range(polls - ack))
+    return out
+
+def transfer(data, batch):
+    """data sent to and received back from a simulated Portfolio"""
+    port = simpofo.simpofo()
+    session = pofosession.PortfolioSession(port, batch, POLLS, timeout=2.0, log=lambda msg: None)
+    session.synchronize()
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'src.bin')
+        with open(src, 'wb') as fd:
+            fd.write(data)
+        session.put(src, 'C:\\DATA.BIN')
+        session.get('C:\\DATA.BIN', os.path.join(tmp, 'dest.bin'))
+        with open(os.path.join(tmp, 'dest.bin'), 'rb') as fd:
+            return port.files['C:\\DATA.BIN'], fd.read()
+
+@unittest.skipIf(nibble.numpy is None, "NumPy not installed")
+class nibbleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(4)
+        self.data = bytes(range(256)) + self.rng.randbytes(1000)
+
+    def both(self, fn, *args):
+        result = fn(*args)
+        with purePython():
+            self.assertEqual(bytes(fn(*args)), bytes(result))
+
+    def testEncode(self):
+        self.both(nibble.encode, self.data)
+
+    def testEncodeProgram(self):
+        for polls in (1, POLLS, 8):
+            self.both(nibble.encodeProgram, self.data, polls)
+
+    def testClockEdgesAndDecode(self):
+        reads = samples(self.data, POLLS, self.rng)
+        edges = nibble.clockEdges(reads, len(self.data), POLLS)
+        self.assertEqual(bytes(nibble.decode(edges)), self.data)
+        with purePython():
+            self.assertEqual(bytes(nibble.clockEdges(reads, len(self.data), POLLS)), bytes(edges))
+            self.assertEqual(bytes(nibble.decode(edges)), self.data)
+
+    def testMissingAcknowledge(self):
+        reads = bytearray(samples(self.data[:4], POLLS, self.rng))
+        # step 13 never sees the clock it waits for
+        reads[13*POLLS:14*POLLS] = bytes([nibble.CLOCK_PATTERN[13 & 7] ^ 0x20]) * POLLS
+        with self.assertRaisesRegex(nibble.nibbleException, "step 13"):
+            nibble.clockEdges(reads, 4, POLLS)
+        with purePython(), self.assertRaisesRegex(nibble.nibbleException, "step 13"):
+            nibble.clockEdges(reads, 4, POLLS)
+
+    def testChecksum(self):
+        self.both(lambda data: bytes([nibble.checksum(data) & 0xff]), self.data)
+
+    def testTransfer(self):
+        for batch in (0, pofosession.BATCH_BYTES):
+            sent, received = transfer(self.data, batch)
+            self.assertEqual((sent, received), (self.data, self.data))
+            with purePython():
+                self.assertEqual(transfer(self.data, batch), (self.data, self.data))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+"""
+# The MIT License (MIT)
+#
+# Copyright © 2022 by Carsten Busse carsten.busse@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sub-license, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+
+"""
+Recovery of PortfolioSession from link errors, against the simulated
+Portfolio: simpofo's garbled sends a block with a wrong checksum.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pofoproto
+import pofosession
+import simpofo
+
+FILES = {f'C:\\FILE{i}.TXT': bytes([i]) * (100 + i) for i in range(1, 5)}
+
+def connect(garbled, retries=pofosession.RETRIES):
+    port = simpofo.simpofo(FILES, garbled=garbled)
+    session = pofosession.PortfolioSession(port, timeout=2.0, retries=retries, log=lambda msg: None)
+    session.synchronize()
+    return session
+
+class recoverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def assertReceived(self):
+        for path, data in FILES.items():
+            with open(os.path.join(self.dest, path[3:])) as fd:
+                self.assertEqual(fd.read().encode('latin-1'), data)
+
+    def testRetriesPerFile(self):
+        # one garbled block in every file, the budget is per file, not per pattern
+        session = connect(list(FILES))
+        names = session.get('C:\\*.TXT', self.dest)
+        self.assertEqual(len(names), len(FILES))
+        self.assertReceived()
+
+    def testRetriesOfOneFile(self):
+        session = connect(['C:\\FILE2.TXT'] * pofosession.RETRIES)
+        session.get('C:\\*.TXT', self.dest)
+        self.assertReceived()
+
+    def testRetriesExhausted(self):
+        session = connect(['C:\\FILE2.TXT'] * (pofosession.RETRIES + 1))
+        with self.assertRaises(pofoproto.pofoprotoChecksumError):
+            session.get('C:\\*.TXT', self.dest)
+        # the file before is complete, the link usable again
+        self.assertTrue(os.path.exists(os.path.join(self.dest, 'FILE1.TXT')))
+        self.assertEqual(session.list('C:\\*.*'), [path[3:] for path in FILES])
+
+    def testFileNumbersAfterRetry(self):
+        # a retry goes on with the file that failed, progress keeps counting
+        session = connect(['C:\\FILE3.TXT'])
+        files = []
+        session.observer = lambda event: files.append(event[2:]) if event[0] == 'file' else None
+        session.get('C:\\*.TXT', self.dest)
+        self.assertEqual(files, [(0, 4), (1, 4), (2, 4), (2, 4), (3, 4)])
+        self.assertEqual((session.progress.file, session.progress.files), (4, 4))
+
+    def testNoRetries(self):
+        session = connect(['C:\\FILE1.TXT'], retries=0)
+        with self.assertRaises(pofoproto.pofoprotoChecksumError):
+            session.get('C:\\*.TXT', self.dest)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -27,7 +27,12 @@
 
 import ctypes
 import ctypes.wintypes as wintypes
+import json
+import linktrace
+import lptport
+import os
 import pyioctl
+import threading
 import time
 
 
@@ -37,34 +42,53 @@ debug = False
 
 slomo = False
 
-class usb2lptException(Exception):
+class usb2lptException(lptport.lptportException):
     pass
 
-class usb2lpt:
+class usb2lptTimeout(usb2lptException, lptport.lptportTimeout):
+    pass
+
+IOCTL_VLPT_XramRead = 0x22228E
+IOCTL_VLPT_OutIn = 0x222010
+
+POLL_READS = 8  # status reads per polling ioctl
+
+PROBE_TIMEOUT = 2.0 # seconds a missing port may take to fail during autodetect
+
+# device path and firmware of the adapters found before, the last one is tried first
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.pytrans-usb2lpt.json')
+
+class usb2lpt(lptport.lptport):
     ioctls = {
-            'IOCTL_VLPT_XramRead':0x22228E,
-            'IOCTL_VLPT_OutIn'   :0x222010,
+            'IOCTL_VLPT_XramRead':IOCTL_VLPT_XramRead,
+            'IOCTL_VLPT_OutIn'   :IOCTL_VLPT_OutIn,
             }
+    pollReads = POLL_READS
+    timeoutException = usb2lptTimeout
+
+    posDevs = [
+        r'\\.\LPT1',
+        r'\\.\LPT2',
+        r'\\.\LPT3',
+        r'\\.\LPT4',
+        ]
 
     def __init__(self,_dev='autodetect'):
-        posDevs = [
-            r'\\.\LPT1',
-            r'\\.\LPT2',
-            r'\\.\LPT3',
-            r'\\.\LPT4',
-            ]
         if _dev=='autodetect':
-            # use first available interface
-            found = False
-            for tdev in posDevs:
-                print(f"Trying to open {tdev}") if debug else None
-                res = self._open(tdev)
-                if res:
-                    self.dev  = tdev
-                    found = True
-                    break
-            if not found:
-                raise usb2lptException("No valid usb2lpt device found!")
+            # the adapter of the last run answers without probing the others
+            probe = self._cachedProbe()
+            if probe is None:
+                probes = self._probeAll(self.posDevs, first=True)
+                if not probes:
+                    raise usb2lptException("No valid usb2lpt device found!")
+                # use first available interface
+                probe = probes[0]
+                for other in probes[1:]:
+                    other._close()
+            self.dev = probe.dev
+            self.dctl = probe.dctl
+            self.firmware = probe.firmware
+            self._saveCache()
         else:
             res = self._open(_dev)
             if res:
@@ -72,8 +96,122 @@ class usb2lpt:
             else:
                 raise usb2lptException("No valid usb2lpt device found!")
 
+        self._ready()
+
+    def _ready(self):
+        self._bind()
         print(f"Device {self.dev} initialised and ready for ioctls (Firmware:{self.firmware})") if verbose else None
 
+    @classmethod
+    def detectAll(cls):
+        """every usb2lpt adapter found, each opened and verified"""
+        ports = cls._probeAll(cls.posDevs)
+        for port in ports:
+            port._ready()
+        return ports
+
+    @classmethod
+    def _probe(cls, dev):
+        """an opened and verified but unbound instance for dev, or None"""
+        probe = cls.__new__(cls)
+        probe.dctl = None
+        lpt = cls.posDevs.index(dev) + 1 if dev in cls.posDevs else 0
+        try:
+            if probe._open(dev):
+                probe.dev = dev
+                cls.trace.record(linktrace.PROBE_FOUND, lpt) if cls.trace else None
+                return probe
+        except (usb2lptException, OSError):
+            pass
+        cls.trace.record(linktrace.PROBE_FAILED, lpt) if cls.trace else None
+        probe._close()
+        return None
+
+    @classmethod
+    def _probeAll(cls, devs, first=False, timeout=PROBE_TIMEOUT):
+        """
+        probe devs concurrently, returns the instances of the devices that
+        answered within timeout seconds, in the order of devs; with first
+        it returns as soon as the first answering one of devs is known
+        """
+        results = {}
+        done = threading.Condition()
+        abandoned = False
+        def run(dev):
+            probe = cls._probe(dev)
+            with done:
+                if abandoned:
+                    # too late, nobody will use or close it
+                    probe._close() if probe else None
+                else:
+                    results[dev] = probe
+                    done.notify()
+        def decided():
+            for dev in devs:
+                if dev not in results:
+                    return False
+                if first and results[dev]:
+                    return True
+            return True
+        # daemon threads, a hanging probe must not keep the process alive
+        for dev in devs:
+            threading.Thread(target=run, args=(dev,), daemon=True).start()
+        with done:
+            done.wait_for(decided, timeout)
+            abandoned = True
+            return [results[dev] for dev in devs if results.get(dev)]
+
+    @classmethod
+    def _cachedProbe(cls):
+        try:
+            with open(CACHE_PATH) as fd:
+                cache = json.load(fd)
+            dev = cache['device']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        probe = cls._probe(dev)
+        if probe and probe.firmware != cache.get('adapters', {}).get(dev):
+            print(f"Adapter at {dev} changed, firmware {probe.firmware}") if verbose else None
+        return probe
+
+    def _saveCache(self):
+        try:
+            with open(CACHE_PATH) as fd:
+                cache = json.load(fd)
+            adapters = dict(cache['adapters'])
+        except (OSError, ValueError, KeyError, TypeError):
+            adapters = {}
+        adapters[self.dev] = self.firmware
+        try:
+            with open(CACHE_PATH + '.part', 'w') as fd:
+                json.dump({'device': self.dev, 'adapters': adapters}, fd, indent=1)
+            os.replace(CACHE_PATH + '.part', CACHE_PATH)
+        except OSError:
+            # only a cache
+            pass
+
+    def _close(self):
+        if self.dctl is not None:
+            self.dctl.__exit__(None, None, None)
+            self.dctl = None
+
+    def _bind(self):
+        # everything the port accesses need is allocated once per device,
+        # the accesses themselves only fill in a value and call DeviceIoControl
+        barr = 3 * ctypes.c_ubyte
+        self._fn = self.dctl.fn
+        self._handle = self.dctl._fhandle
+        self._lpReturned = self.dctl.lpBytesReturned
+        self._opData = barr(0x10)
+        self._opStatus = barr(0x11)
+        self._opControl = barr(0x12)
+        self._opTriple = barr(0x10,0x11,0x12)
+        self._opOut = barr(0,0)
+        self._opTripleOut = (6 * ctypes.c_ubyte)(0,0,1,0,2,0)
+        self._result = barr(0,0,0)
+        self._opPoll = (POLL_READS * ctypes.c_ubyte)(*[0x11] * POLL_READS)
+        self._pollResult = (POLL_READS * ctypes.c_ubyte)()
+
     def _open(self,dev):
         self.dctl = pyioctl.DeviceIoControl(dev)
         try:
@@ -124,172 +262,96 @@ https://learn.microsoft.com/de-de/windows/win32/api/winbase/nf-winbase-dosdateti
             else:
                 return False
 
+    def _error(self, msg):
+        lErr = ctypes.get_last_error()
+        strErr = ctypes.WinError(lErr)
+        return usb2lptException(f"{msg} IO Error {strErr.args[0]} '{strErr.args[1]}'")
+
     def directIO(self):
         # not sure if this is needed for Portfolio
         print("Switching device to directIO Mode") if verbose else None
-        self.dctl._validate()
-        barr = 2 * ctypes.c_ubyte
-        sdmode = barr(15,1 << 6)   # bit 6 st or set value 6= mmh
-        p_sdmode = ctypes.pointer(sdmode)
-        try:
-            status, junk = self.dctl.ioctl(self.ioctls['IOCTL_VLPT_OutIn'],
-                                           p_sdmode,ctypes.sizeof(ctypes.c_byte)*2,
-                                           None,0)
-        except pyioctl.DeviceIoControlException:
-            lErr = ctypes.get_last_error()
-            strErr = ctypes.WinError(lErr)
-            raise usb2lptException(f"IO Error {strErr.args[0]} '{strErr.args[1]}'")
+        self._opOut[0] = 15
+        self._opOut[1] = 1 << 6   # bit 6 st or set value 6= mmh
+        if not self._fn(self._handle, IOCTL_VLPT_OutIn, self._opOut, 2, None, 0, self._lpReturned, None):
+            raise self._error("Could not switch to directIO Mode!")
 
     def inData(self):
-        #self.dctl._validate()
-        b = ctypes.c_ubyte(0x10)   # read data port
-        p_b = ctypes.pointer(b)
-        rv = ctypes.c_ubyte(0)
-        p_rv = ctypes.pointer(rv)
-        try:
-            status, junk = self.dctl.ioctl(self.ioctls['IOCTL_VLPT_OutIn'],
-                                           p_b,ctypes.sizeof(ctypes.c_byte),
-                                           p_rv,ctypes.sizeof(ctypes.c_byte))
-        except pyioctl.DeviceIoControlException:
-            lErr = ctypes.get_last_error()
-            strErr = ctypes.WinError(lErr)
-            raise usb2lptException(f"IO Error {strErr.args[0]} '{strErr.args[1]}'")
-        else:
-            if status:
-                return rv.value
-            else:
-                raise usb2lptException("Could not gather Value from Data port!")
+        if self._fn(self._handle, IOCTL_VLPT_OutIn, self._opData, 1, self._result, 1, self._lpReturned, None):
+            return self._result[0]
+        raise self._error("Could not gather Value from Data port!")
 
     def inStatus(self):
-        #self.dctl._validate()
-        b = ctypes.c_ubyte(0x11)  #  read status port
-        p_b = ctypes.pointer(b)
-        rv = ctypes.c_ubyte(0)
-        p_rv = ctypes.pointer(rv)
-        try:
-            status, junk = self.dctl.ioctl(self.ioctls['IOCTL_VLPT_OutIn'],
-                                           p_b,ctypes.sizeof(ctypes.c_byte),
-                                           p_rv,ctypes.sizeof(ctypes.c_byte))
-        except pyioctl.DeviceIoControlException:
-            lErr = ctypes.get_last_error()
-            strErr = ctypes.WinError(lErr)
-            raise usb2lptException(f"IO Error {strErr.args[0]} '{strErr.args[1]}'")
-        else:
-            if status:
-                return rv.value
-            else:
-                raise usb2lptException("Could not gather Value from Status port!")
+        if self._fn(self._handle, IOCTL_VLPT_OutIn, self._opStatus, 1, self._result, 1, self._lpReturned, None):
+            return self._result[0]
+        raise self._error("Could not gather Value from Status port!")
+
+    def pollStatus(self, mask, value):
+        # POLL_READS status samples with a single ioctl
+        result = self._pollResult
+        if not self._fn(self._handle, IOCTL_VLPT_OutIn, self._opPoll, POLL_READS, result, POLL_READS, self._lpReturned, None):
+            raise self._error("Could not poll Status port!")
+        for status in result:
+            if status & mask == value:
+                return status
+        return None
 
     def inControl(self):
-        #self.dctl._validate()
-        b = ctypes.c_ubyte(0x12)  #  read Control port
-        p_b = ctypes.pointer(b)
-        rv = ctypes.c_ubyte(0)
-        p_rv = ctypes.pointer(rv)
-        try:
-            status, junk = self.dctl.ioctl(self.ioctls['IOCTL_VLPT_OutIn'],
-                                           p_b,ctypes.sizeof(ctypes.c_byte),
-                                           p_rv,ctypes.sizeof(ctypes.c_byte))
-        except pyioctl.DeviceIoControlException:
-            lErr = ctypes.get_last_error()
-            strErr = ctypes.WinError(lErr)
-            raise usb2lptException(f"IO Error {strErr.args[0]} '{strErr.args[1]}'")
-        else:
-            if status:
-                return rv.value
-            else:
-                raise usb2lptException("Could not gather Value from Dataport!")
+        if self._fn(self._handle, IOCTL_VLPT_OutIn, self._opControl, 1, self._result, 1, self._lpReturned, None):
+            return self._result[0]
+        raise self._error("Could not gather Value from Control port!")
 
     def inTriple(self):
-        #self.dctl._validate()
-        barr = 3 * ctypes.c_ubyte
-        selp = barr(0x10,0x11,0x12) # read from data, status and control port
-        p_selp = ctypes.pointer(selp)
-        rp = barr(0,0,0)
-        p_rp = ctypes.pointer(rp)
-        try:
-            status, junk = self.dctl.ioctl(self.ioctls['IOCTL_VLPT_OutIn'],
-                                           p_selp,ctypes.sizeof(ctypes.c_ubyte)*3,
-                                           p_rp,ctypes.sizeof(ctypes.c_ubyte)*3)
-        except pyioctl.DeviceIoControlException:
-            lErr = ctypes.get_last_error()
-            strErr = ctypes.WinError(lErr)
-            raise usb2lptException(f"IO Error {strErr.args[0]} '{strErr.args[1]}'")
-        else:
-            if status:
-                return (rp[0], rp[1], rp[2])
-            else:
-                raise usb2lptException("Could not gather Values from Device!")
+        # read from data, status and control port
+        result = self._result
+        if self._fn(self._handle, IOCTL_VLPT_OutIn, self._opTriple, 3, result, 3, self._lpReturned, None):
+            return (result[0], result[1], result[2])
+        raise self._error("Could not gather Values from Device!")
 
     def outData(self, data):
-        #self.dctl._validate()
-        barr = 2 * ctypes.c_ubyte
-        oarr = barr(0,data)
-        p_oarr = ctypes.pointer(oarr)
-        try:
-            status, junk = self.dctl.ioctl(self.ioctls['IOCTL_VLPT_OutIn'],
-                                           p_oarr,ctypes.sizeof(ctypes.c_ubyte)*2,
-                                           None, 0)
-        except pyioctl.DeviceIoControlException:
-            lErr = ctypes.get_last_error()
-            strErr = ctypes.WinError(lErr)
-            raise usb2lptException(f"IO Error {strErr.args[0]} '{strErr.args[1]}'")
-        else:
-            if not status:
-                raise usb2lptException("Could not output Value to Data Port!")
-
+        self._opOut[0] = 0
+        self._opOut[1] = data
+        if not self._fn(self._handle, IOCTL_VLPT_OutIn, self._opOut, 2, None, 0, self._lpReturned, None):
+            raise self._error("Could not output Value to Data Port!")
 
     def outStatus(self, data):
-        self.dctl._validate()
-        barr = 2 * ctypes.c_ubyte
-        oarr = barr(1,data)
-        p_oarr = ctypes.pointer(oarr)
-        try:
-            status, junk = self.dctl.ioctl(self.ioctls['IOCTL_VLPT_OutIn'],
-                                           p_oarr,ctypes.sizeof(ctypes.c_ubyte)*2,
-                                           None, 0)
-        except pyioctl.DeviceIoControlException:
-            lErr = ctypes.get_last_error()
-            strErr = ctypes.WinError(lErr)
-            raise usb2lptException(f"IO Error {strErr.args[0]} '{strErr.args[1]}'")
-        else:
-            if not status:
-                raise usb2lptException("Could not output Value to Status Port!")
+        self._opOut[0] = 1
+        self._opOut[1] = data
+        if not self._fn(self._handle, IOCTL_VLPT_OutIn, self._opOut, 2, None, 0, self._lpReturned, None):
+            raise self._error("Could not output Value to Status Port!")
 
     def outControl(self, data):
-        self.dctl._validate()
-        barr = 2 * ctypes.c_ubyte
-        oarr = barr(2,data)
-        p_oarr = ctypes.pointer(oarr)
-        try:
-            status, junk = self.dctl.ioctl(self.ioctls['IOCTL_VLPT_OutIn'],
-                                           p_oarr,ctypes.sizeof(ctypes.c_byte)*2,
-                                           None, 0)
-        except pyioctl.DeviceIoControlException:
-            lErr = ctypes.get_last_error()
-            strErr = ctypes.WinError(lErr)
-            raise usb2lptException(f"IO Error {strErr.args[0]} '{strErr.args[1]}'")
-        else:
-            if not status:
-                raise usb2lptException("Could not output Value to Control Port!")
+        self._opOut[0] = 2
+        self._opOut[1] = data
+        if not self._fn(self._handle, IOCTL_VLPT_OutIn, self._opOut, 2, None, 0, self._lpReturned, None):
+            raise self._error("Could not output Value to Control Port!")
 
     def outTriple(self, darr):
-        self.dctl._validate()
-        barr = 6 * ctypes.c_ubyte
-        oarr = barr(0,darr[0],1,darr[1],2,darr[2])
-        p_oarr = ctypes.pointer(oarr)
-        try:
-            status, junk = self.dctl.ioctl(self.ioctls['IOCTL_VLPT_OutIn'],
-                                           p_oarr,ctypes.sizeof(ctypes.c_byte)*2,
-                                           None, 0)
-        except pyioctl.DeviceIoControlException:
-            lErr = ctypes.get_last_error()
-            strErr = ctypes.WinError(lErr)
-            raise usb2lptException(f"IO Error {strErr.args[0]} '{strErr.args[1]}'")
-        else:
-            if not status:
-                raise usb2lptException("Could not output Values to Device!")
-
+        op = self._opTripleOut
+        op[1] = darr[0]
+        op[3] = darr[1]
+        op[5] = darr[2]
+        if not self._fn(self._handle, IOCTL_VLPT_OutIn, op, 6, None, 0, self._lpReturned, None):
+            raise self._error("Could not output Values to Device!")
+
+    def runProgram(self, prog):
+        """
+        run a lptport.lptProgram with one ioctl per segment,
+        returns a bytearray with the result of every read opcode in order
+        """
+        result = bytearray(prog.nReads)
+        pos = 0
+        for code, nReads in prog.segments:
+            if not code:
+                continue
+            ibuf = (ctypes.c_ubyte * len(code)).from_buffer(code)
+            if nReads:
+                obuf = (ctypes.c_ubyte * nReads).from_buffer(result, pos)
+            else:
+                obuf = None
+            if not self._fn(self._handle, IOCTL_VLPT_OutIn, ibuf, len(code), obuf, nReads, self._lpReturned, None):
+                raise self._error("Could not run program on Device!")
+            pos += nReads
+        return result
 
 
    
@@ -306,6 +368,8 @@ if __name__ == '__main__':
       -  the HPC101 Parallel Port Interface of the Portfolio
       -  1:1 Parallel Port cable to connect the portfolio to the pc
     """
+    import pofoproto
+
     receiveInit = bytearray(82)  # maxsize is 62
     receiveInit[0] = 0x06
     receiveInit[1] = 0x00
@@ -448,11 +512,6 @@ if __name__ == '__main__':
         return length
 
     def listFiles(pattern):
-        i = num = 0
-        global names, name        
-        name = ""
-        global payload 
-        payload = bytearray(60000)
         if (len(pattern) > 82-3):
             print(f"Search Pattern too long! (maxlength : 79, pattern:{len(pattern)})")
             exit(1)
@@ -460,21 +519,16 @@ if __name__ == '__main__':
         for i in range(len(pattern)):
             receiveInit[i+3] = bytes(pattern[i],'utf-8')[0]
         sendBlock(receiveInit,82)
-        receiveBlock(payload, 60000)
+        length = receiveBlock(payload, 60000)
 
-        num = (payload[1] << 8) | payload[0]
-        if num == 0:
+        names = pofoproto.parseListing(memoryview(payload)[:length])
+        if not names:
             print("No Files found")
             return
-        names = list()
-        for i in range(60000-2):
-            name += chr(payload[i+2]) if payload[i+2] != 0 else ""
-            if payload[i+2] == 0:
-                names += [name] if name != '' else []
-                name = ""
         print(f"Found {len(names)} Files.")
         print("\n".join(names))
 
+    payload = bytearray(60000)
     myport = usb2lpt()
     listFiles('c:\\*.*')
 